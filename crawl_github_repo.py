@@ -1,13 +1,29 @@
 import shutil
+import argparse
 import base64
+import hashlib
 import json
 import requests
 import os
 import sys
-import subprocess
+import zipfile
+import time
+import tempfile
+import queue
+import sqlite3
+import threading
+from email.utils import parsedate_to_datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
 from bandit import run_bandit_and_open_report as run
-from generate_encrypt_function import EncryptionExtractor
+from generate_encrypt_function import EncryptionExtractor, DuplicateIndex
+from oracle_worker import OracleClient, OracleError
+from ecb_attack import recover_secret
+from oracle_probe import QueryBudgetExceeded
+from oracle_cache import OracleCache
+from oracle_sandbox import OraclePool, SandboxLimits, SandboxedClient
 
 # 設置您的個人訪問令牌
 token = ""  # 注意：建議不要將令牌硬編碼在程式中
@@ -16,13 +32,324 @@ headers = {
     "Accept": "application/vnd.github+json"
 }
 
-def download_repository(repo_name, download_path=None):
+# GitHub API 地址（測試時可指向本地的替身服務）
+API_BASE = "https://api.github.com"
+
+# 連接池大小，應不小於並發下載數
+SESSION_POOL_SIZE = 16
+
+def create_session(pool_size=SESSION_POOL_SIZE):
+    """
+    創建帶連接池的 HTTP 會話，所有請求共用 TLS 連接
+    
+    參數:
+        pool_size (int): 每個主機保持的連接數
+    
+    返回:
+        requests.Session: 已設置認證頭的會話
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# 本地內容尋址鏡像的默認位置和大小上限
+DEFAULT_MIRROR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mirror")
+MIRROR_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+class BlobStore:
+    """
+    內容尋址的本地鏡像，可在多個線程間共用
+    
+    - objects/: zipball 中的每個 .py 文件按 SHA-256 存儲，跨存儲庫和提交只保存一份
+    - refs/: 提交 SHA -> 文件清單（manifest）的摘要；
+      fork 與上游在同一提交時直接命中，無需再次下載
+    
+    默認不保存完整的 zipball（每個提交一份，無法跨提交去重），需要時由清單重建只含 .py 文件的 ZIP；
+    keep_zipballs 為 True 時同時保存 zipball
+    
+    寫入的對象累計超出大小上限時才按最近使用時間淘汰；清單引用的文件被淘汰後該清單視為失效
+    """
+    
+    def __init__(self, root=DEFAULT_MIRROR_DIR, max_bytes=MIRROR_MAX_BYTES, keep_zipballs=False):
+        """
+        參數:
+            root (str): 鏡像目錄
+            max_bytes (int, optional): 對象總大小上限，None 表示不限制
+            keep_zipballs (bool): 是否同時保存完整的 zipball
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.keep_zipballs = keep_zipballs
+        self._lock = threading.Lock()
+        self._size = None
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "refs").mkdir(exist_ok=True)
+    
+    def _object_path(self, digest):
+        return self.root / "objects" / digest[:2] / digest
+    
+    def _ref_path(self, kind, key):
+        return self.root / "refs" / kind / key
+    
+    def put(self, file_obj):
+        """
+        從文件對象流式寫入一個對象（已存在時不重複寫入）
+        
+        返回:
+            str: 對象的 SHA-256 摘要
+        """
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.root / "objects", delete=False) as temp_file:
+            for chunk in iter(lambda: file_obj.read(65536), b""):
+                digest.update(chunk)
+                temp_file.write(chunk)
+        return self._commit(Path(temp_file.name), digest.hexdigest())
+    
+    def put_bytes(self, data):
+        """寫入一段字節，返回其摘要"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.path(digest) is not None:
+            return digest
+        with tempfile.NamedTemporaryFile(dir=self.root / "objects", delete=False) as temp_file:
+            temp_file.write(data)
+        return self._commit(Path(temp_file.name), digest)
+    
+    def _commit(self, temp_path, digest):
+        object_path = self._object_path(digest)
+        object_path.parent.mkdir(exist_ok=True)
+        if object_path.exists():
+            temp_path.unlink()
+        else:
+            size = temp_path.stat().st_size
+            os.replace(temp_path, object_path)
+            with self._lock:
+                if self._size is not None:
+                    self._size += size
+        return digest
+    
+    def path(self, digest):
+        """返回對象文件路徑並標記為最近使用，不存在時為 None"""
+        object_path = self._object_path(digest)
+        try:
+            os.utime(object_path)
+        except OSError:
+            return None
+        return object_path
+    
+    def read_bytes(self, digest):
+        object_path = self.path(digest)
+        return object_path.read_bytes() if object_path else None
+    
+    def set_ref(self, kind, key, digest):
+        ref_path = self._ref_path(kind, key)
+        ref_path.parent.mkdir(exist_ok=True)
+        ref_path.write_text(digest)
+    
+    def get_ref(self, kind, key):
+        """返回引用指向的對象摘要，引用或對象不存在時為 None"""
+        try:
+            digest = self._ref_path(kind, key).read_text().strip()
+        except OSError:
+            return None
+        return digest if self.path(digest) is not None else None
+    
+    def add_archive(self, commit_sha, archive):
+        """
+        保存 zipball 中的 .py 文件和文件清單（keep_zipballs 時還有 zipball），並以提交 SHA 記錄引用
+        
+        引用在所有對象寫入後才記錄，ZIP 損壞時不會留下指向不完整內容的引用
+        
+        參數:
+            commit_sha (str): 提交 SHA
+            archive (file): 讀取位置在開頭的 ZIP 文件對象，返回時讀取位置回到開頭
+        
+        返回:
+            dict: 文件清單，相對路徑（去掉 zipball 根目錄）-> 文件摘要
+        
+        異常:
+            zipfile.BadZipFile: archive 不是有效的 ZIP 文件
+        """
+        manifest = {}
+        try:
+            with zipfile.ZipFile(archive) as zip_file:
+                for info in zip_file.infolist():
+                    if info.is_dir() or not info.filename.endswith(".py"):
+                        continue
+                    relative_path = info.filename.split("/", 1)[-1]
+                    manifest[relative_path] = self.put_bytes(zip_file.read(info))
+            archive.seek(0)
+            zipball_digest = self.put(archive) if self.keep_zipballs else None
+        finally:
+            archive.seek(0)
+        
+        manifest_digest = self.put_bytes(json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        if zipball_digest:
+            self.set_ref("zipball", commit_sha, zipball_digest)
+        self.set_ref("manifest", commit_sha, manifest_digest)
+        self.evict_if_full()
+        return manifest
+    
+    def zipball_path(self, commit_sha):
+        """返回提交對應的 zipball 文件路徑，未鏡像時為 None"""
+        digest = self.get_ref("zipball", commit_sha)
+        return self.path(digest) if digest else None
+    
+    def get_manifest(self, commit_sha):
+        """返回提交的文件清單，未鏡像或其中的文件已被淘汰時為 None"""
+        digest = self.get_ref("manifest", commit_sha)
+        manifest = json.loads(self.read_bytes(digest)) if digest else None
+        if manifest is None or any(self.path(file_digest) is None for file_digest in manifest.values()):
+            return None
+        return manifest
+    
+    def build_archive(self, commit_sha, root_name, max_memory=64 * 1024 * 1024):
+        """
+        由文件清單重建只包含 .py 文件的 ZIP（不需要重新下載 zipball）
+        
+        返回:
+            SpooledTemporaryFile: 讀取位置在開頭的 ZIP 文件對象，清單不可用時為 None
+        """
+        manifest = self.get_manifest(commit_sha)
+        if manifest is None:
+            return None
+        archive = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+            for relative_path, file_digest in sorted(manifest.items()):
+                zip_file.writestr(f"{root_name}/{relative_path}", self.read_bytes(file_digest))
+        archive.seek(0)
+        return archive
+    
+    def open_archive(self, commit_sha, root_name, max_memory=64 * 1024 * 1024):
+        """優先打開鏡像中的 zipball，否則由文件清單重建；都沒有時為 None"""
+        zipball_path = self.zipball_path(commit_sha)
+        if zipball_path is not None:
+            return open(zipball_path, "rb")
+        return self.build_archive(commit_sha, root_name, max_memory)
+    
+    def _scan(self):
+        objects = []
+        for object_path in self.root.glob("objects/*/*"):
+            try:
+                stat = object_path.stat()
+            except OSError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, object_path))
+        return objects
+    
+    def evict_if_full(self):
+        """
+        只在對象總大小超過上限時淘汰，返回刪除的對象數
+        
+        總大小在第一次調用時遍歷一次對象目錄，之後按新寫入的對象累加，不再每次遍歷
+        """
+        if self.max_bytes is None:
+            return 0
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            if self._size <= self.max_bytes:
+                return 0
+        return self.evict()
+    
+    def evict(self):
+        """按最近使用時間淘汰對象到大小上限以內，返回刪除的對象數"""
+        if self.max_bytes is None:
+            return 0
+        with self._lock:
+            objects = self._scan()
+            total_size = sum(size for _, size, _ in objects)
+            removed = 0
+            for _, size, object_path in sorted(objects):
+                if total_size <= self.max_bytes:
+                    break
+                object_path.unlink(missing_ok=True)
+                total_size -= size
+                removed += 1
+            self._size = total_size
+            return removed
+
+def _mirror_root_name(repo_name, ref):
+    """鏡像重建的 ZIP 使用與 zipball 相同形式的根目錄名"""
+    return f"{repo_name.replace('/', '-')}-{ref[:7]}"
+
+def _stream_zipball(repo_name, file_obj, session=None, api_base=API_BASE, ref=None):
+    """
+    將存儲庫的 zipball 流式寫入文件對象
+    
+    參數:
+        ref (str, optional): 提交 SHA 或分支名，默認為存儲庫的默認分支
+    
+    返回:
+        int: 寫入的字節數
+    """
+    download_url = f"{api_base}/repos/{repo_name}/zipball"
+    if ref:
+        download_url += f"/{ref}"
+    client = session or requests
+    written = 0
+    with client.get(download_url, headers=headers, stream=True) as repo_response:
+        repo_response.raise_for_status()  # 檢查請求是否成功
+        for chunk in repo_response.iter_content(chunk_size=65536):
+            file_obj.write(chunk)
+            written += len(chunk)
+    return written
+
+def _zip_file_name(repo_name, ref=None):
+    """ZIP 文件名；固定到提交 SHA 時包含 SHA，同一提交只需下載一次"""
+    zip_file_name = repo_name.replace('/', '_')
+    if ref:
+        zip_file_name += f"-{ref}"
+    return f"{zip_file_name}.zip"
+
+def _download_to_store(repo_name, store, zip_file_path, session=None, api_base=API_BASE, ref=None):
+    """
+    通過本地鏡像獲取固定提交的 ZIP 文件
+    
+    - 鏡像保存了該提交的 zipball 時直接返回鏡像中的文件
+    - 鏡像有該提交的文件清單時，在 zip_file_path 重建只含 .py 文件的 ZIP，不需要下載
+    - 否則下載到 zip_file_path，並把其中的 .py 文件加入鏡像
+    
+    返回:
+        tuple: (ZIP 文件路徑, 實際下載的字節數)
+    
+    異常:
+        requests.exceptions.RequestException, OSError, zipfile.BadZipFile: 下載或鏡像失敗，
+            zip_file_path 中寫了一半的文件由調用方刪除
+    """
+    zipball_path = store.zipball_path(ref)
+    if zipball_path is not None:
+        print(f"存儲庫 {repo_name}@{ref[:12]} 已在本地鏡像中: {zipball_path}")
+        return str(zipball_path), 0
+    
+    archive = store.build_archive(ref, _mirror_root_name(repo_name, ref))
+    if archive is not None:
+        with archive, open(zip_file_path, "wb") as f:
+            shutil.copyfileobj(archive, f)
+        print(f"已由本地鏡像重建存儲庫 {repo_name}@{ref[:12]}: {zip_file_path}")
+        return zip_file_path, 0
+    
+    print(f"正在下載存儲庫: {repo_name}")
+    with open(zip_file_path, "wb") as f:
+        written = _stream_zipball(repo_name, f, session, api_base, ref)
+    with open(zip_file_path, "rb") as f:
+        store.add_archive(ref, f)
+    print(f"存儲庫已下載為: {zip_file_path}")
+    return zip_file_path, written
+
+def download_repository(repo_name, download_path=None, session=None, api_base=API_BASE, ref=None, store=None):
     """
     下載 GitHub 存儲庫
     
     參數:
         repo_name (str): 存儲庫名稱 (格式: 用戶名/存儲庫名)
         download_path (str, optional): 下載目錄
+        session (requests.Session, optional): 共用的 HTTP 會話
+        api_base (str, optional): GitHub API 地址
+        ref (str, optional): 要下載的提交 SHA，默認為默認分支的最新提交
+        store (BlobStore, optional): 本地鏡像；提供 ref 時 .py 文件保存到鏡像中，已鏡像的提交不再下載
     
     返回:
         str: 下載的 ZIP 文件路徑
@@ -34,61 +361,975 @@ def download_repository(repo_name, download_path=None):
     # 確保下載目錄存在
     os.makedirs(download_path, exist_ok=True)
     
-    # 下載 URL
-    download_url = f"https://api.github.com/repos/{repo_name}/zipball/main"
-    print(f"正在下載存儲庫: {repo_name}")
+    # 設置 ZIP 文件名稱
+    zip_file_path = os.path.join(download_path, _zip_file_name(repo_name, ref))
+    if ref and zipfile.is_zipfile(zip_file_path):
+        print(f"存儲庫 {repo_name}@{ref[:12]} 已下載: {zip_file_path}")
+        return zip_file_path
     
     try:
-        # 發送 GET 請求
-        repo_response = requests.get(download_url, headers=headers, stream=True)
-        repo_response.raise_for_status()  # 檢查請求是否成功
-        
-        # 設置 ZIP 文件名稱
-        zip_file_name = f"{repo_name.replace('/', '_')}.zip"
-        zip_file_path = os.path.join(download_path, zip_file_name)
+        if store is not None and ref:
+            zip_file_path, _ = _download_to_store(repo_name, store, zip_file_path, session, api_base, ref)
+            return zip_file_path
         
+        print(f"正在下載存儲庫: {repo_name}")
         # 保存 ZIP 文件
         with open(zip_file_path, "wb") as f:
-            for chunk in repo_response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            _stream_zipball(repo_name, f, session, api_base, ref)
         
         print(f"存儲庫已下載為: {zip_file_path}")
         return zip_file_path
     
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, OSError, zipfile.BadZipFile) as e:
         print(f"下載存儲庫時出錯: {str(e)}")
+        if os.path.exists(zip_file_path):
+            os.remove(zip_file_path)
         return None
 
-def main():
-    # 步驟1：搜索包含特定代碼的存儲庫
-    search_query = "cipher+AES.new+AES.MODE_ECB+language:python"
-    search_url = f"https://api.github.com/search/code?q={search_query}"
+def download_repositories(full_names, download_path=None, max_workers=4, session=None, api_base=API_BASE,
+                          refs=None, store=None):
+    """
+    並發下載多個存儲庫，共用一個帶連接池的會話
+    
+    參數:
+        full_names (list): 存儲庫名稱列表 (格式: 用戶名/存儲庫名)
+        download_path (str, optional): 下載目錄
+        max_workers (int): 最大並發下載數
+        session (requests.Session, optional): 共用的 HTTP 會話，默認新建
+        api_base (str, optional): GitHub API 地址
+        refs (dict, optional): 存儲庫名稱 -> 要下載的提交 SHA；已下載過的提交直接復用
+        store (BlobStore, optional): 本地鏡像，固定了提交的存儲庫保存到鏡像中
+    
+    返回:
+        list: 按輸入順序排列的結果，每項包含 full_name、path、bytes（實際下載的字節數，
+            從本地復用時為 0）、seconds、throughput（字節/秒）和 error
+    """
+    if download_path is None:
+        download_path = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(download_path, exist_ok=True)
+    
+    own_session = session is None
+    if own_session:
+        session = create_session(max(SESSION_POOL_SIZE, max_workers))
+    
+    refs = refs or {}
+    
+    def download_one(full_name):
+        ref = refs.get(full_name)
+        zip_file_path = os.path.join(download_path, _zip_file_name(full_name, ref))
+        result = {'full_name': full_name, 'path': None, 'bytes': 0, 'seconds': 0.0,
+                  'throughput': 0.0, 'error': None}
+        if ref and zipfile.is_zipfile(zip_file_path):
+            result['path'] = zip_file_path
+            return result
+        started = time.perf_counter()
+        try:
+            if store is not None and ref:
+                result['path'], result['bytes'] = _download_to_store(full_name, store, zip_file_path,
+                                                                     session, api_base, ref)
+            else:
+                with open(zip_file_path, "wb") as f:
+                    result['bytes'] = _stream_zipball(full_name, f, session, api_base, ref)
+                result['path'] = zip_file_path
+        except (requests.exceptions.RequestException, OSError, zipfile.BadZipFile) as e:
+            result['error'] = str(e)
+            if os.path.exists(zip_file_path):
+                os.remove(zip_file_path)
+        result['seconds'] = time.perf_counter() - started
+        if result['seconds'] > 0:
+            result['throughput'] = result['bytes'] / result['seconds']
+        return result
+    
+    results = {}
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download_one, name): name for name in full_names}
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['full_name']] = result
+                if result['error']:
+                    print(f"下載 {result['full_name']} 時出錯: {result['error']}")
+                elif not result['bytes']:
+                    print(f"已復用 {result['full_name']}: {result['path']}")
+                else:
+                    print(f"已下載 {result['full_name']}: {result['bytes'] / 1024:.1f} KB, "
+                          f"{result['throughput'] / 1024:.1f} KB/s")
+    finally:
+        if own_session:
+            session.close()
+    
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(result['bytes'] for result in results.values())
+    if elapsed > 0:
+        print(f"共下載 {len(results)} 個存儲庫, {total_bytes / 1024 / 1024:.2f} MB, "
+              f"{total_bytes / 1024 / 1024 / elapsed:.2f} MB/s")
+    return [results[name] for name in full_names if name in results]
+
+# 流水線模式下 zipball 在內存中緩衝的上限，超過後溢出到臨時文件
+SPOOL_MAX_MEMORY = 64 * 1024 * 1024
+
+def fetch_repository_archive(repo_name, max_memory=SPOOL_MAX_MEMORY, session=None, api_base=API_BASE,
+                             ref=None, store=None):
+    """
+    下載 GitHub 存儲庫的 zipball 到內存緩衝，不寫入下載目錄
+    
+    參數:
+        repo_name (str): 存儲庫名稱 (格式: 用戶名/存儲庫名)
+        max_memory (int): 內存緩衝上限（字節），超過後溢出到臨時文件
+        session (requests.Session, optional): 共用的 HTTP 會話
+        api_base (str, optional): GitHub API 地址
+        ref (str, optional): 要下載的提交 SHA，默認為默認分支的最新提交
+        store (BlobStore, optional): 本地鏡像；提供 ref 時已鏡像的提交直接從鏡像讀取，新下載的保存到鏡像
     
+    返回:
+        file: 讀取位置已回到開頭的 ZIP 文件對象，下載失敗或 ZIP 無法加入鏡像時為 None
+    """
+    if store is not None and ref:
+        archive = store.open_archive(ref, _mirror_root_name(repo_name, ref), max_memory)
+        if archive is not None:
+            print(f"從本地鏡像讀取存儲庫: {repo_name}@{ref[:12]}")
+            return archive
+    
+    print(f"正在下載存儲庫: {repo_name}")
+    
+    archive = tempfile.SpooledTemporaryFile(max_size=max_memory)
     try:
-        print(f"搜索: {search_query}")
-        search_response = requests.get(search_url, headers=headers)
-        search_response.raise_for_status()  # 檢查請求是否成功
+        _stream_zipball(repo_name, archive, session, api_base, ref)
+        archive.seek(0)
+        if store is not None and ref:
+            store.add_archive(ref, archive)
+        return archive
+    
+    except (requests.exceptions.RequestException, OSError, zipfile.BadZipFile) as e:
+        archive.close()
+        print(f"下載存儲庫時出錯: {str(e)}")
+        return None
+
+def iter_repository_archives(repo_names, max_memory=SPOOL_MAX_MEMORY, prefetch=1, session=None, refs=None,
+                             store=None, api_base=API_BASE, resolve_heads=False, state=None):
+    """
+    下載與分析重疊的流水線：調用方處理第 N 個存儲庫時，後台線程已在下載後續存儲庫
+    
+    參數:
+        repo_names (iterable): 存儲庫名稱序列
+        max_memory (int): 每個 zipball 的內存緩衝上限（字節）
+        prefetch (int): 提前下載的存儲庫數量
+        session (requests.Session, optional): 共用的 HTTP 會話
+        refs (dict, optional): 存儲庫名稱 -> 要下載的提交 SHA
+        store (BlobStore, optional): 本地鏡像
+        api_base (str, optional): GitHub API 地址
+        resolve_heads (bool): 為 refs 中沒有的存儲庫在預取線程中解析默認分支的最新提交 SHA，
+            SHA 查詢與前面存儲庫的下載和分析重疊
+        state (CrawlState, optional): 爬取狀態；解析出的 SHA 與上次掃描相同時跳過該存儲庫
+    
+    返回:
+        generator: 逐個產生 (存儲庫名稱, 提交 SHA 或 None, ZIP 文件對象或 None)，
+            跳過的存儲庫不產生結果，文件對象在調用方取下一個結果時關閉
+    """
+    names = iter(repo_names)
+    refs = refs or {}
+    pending = deque()
+    
+    def fetch(repo_name):
+        ref = refs.get(repo_name)
+        if ref is None and resolve_heads:
+            ref = fetch_head_sha(repo_name, session, state, api_base=api_base)
+            if state is not None and ref is not None and ref == state.last_scanned_sha(repo_name):
+                print(f"⏭️ {repo_name} 自上次掃描以來沒有變化，跳過下載")
+                return ref, None, True
+        archive = fetch_repository_archive(repo_name, max_memory, session, api_base, ref=ref, store=store)
+        return ref, archive, False
+    
+    with ThreadPoolExecutor(max_workers=max(1, prefetch)) as downloader:
+        def submit(repo_name):
+            pending.append((repo_name, downloader.submit(fetch, repo_name)))
         
-        search_results = search_response.json()
+        for repo_name in islice(names, max(1, prefetch)):
+            submit(repo_name)
+        
+        while pending:
+            repo_name, future = pending.popleft()
+            next_name = next(names, None)
+            if next_name is not None:
+                submit(next_name)
             
-        # 保存搜索結果
-        with open("search_results.json", "w") as f:
-            json.dump(search_results, f, indent=4)
+            ref, archive, skipped = future.result()
+            if skipped:
+                continue
+            try:
+                yield repo_name, ref, archive
+            finally:
+                if archive is not None:
+                    archive.close()
+
+def analyze_repository_archive(repo_name, archive, output_dir, **extractor_options):
+    """
+    直接分析內存中的 zipball 並生成 Oracle 文件
+    
+    返回:
+        str: 生成的 Oracle 文件路徑，未找到加密代碼時為 None
+    """
+    extractor = EncryptionExtractor(archive, project_name=repo_name.replace('/', '_'), **extractor_options)
+    if not extractor.analyze_project():
+        return None
+    output_file = os.path.join(output_dir, repo_name.replace('/', '_'), "ecb_encrypt.py")
+    return extractor.generate_fixed_oracle_file(output_file)
+
+def run_pipeline(repo_names, output_dir, max_memory=SPOOL_MAX_MEMORY, prefetch=1, session=None,
+                 state=None, store=None, api_base=API_BASE, **extractor_options):
+    """
+    流水線模式：依次下載並分析存儲庫，下載第 N+1 個時同時分析第 N 個
+    
+    每個存儲庫在預取線程中解析默認分支的最新提交 SHA，並下載固定到該提交的 zipball；
+    提供 state 時，SHA 與上次掃描相同的存儲庫不再下載，也不出現在結果中；
+    提供 store 時已鏡像的提交從本地讀取
+    
+    返回:
+        dict: 存儲庫名稱 -> 生成的 Oracle 文件路徑（失敗或未找到時為 None）
+    """
+    results = {}
+    for repo_name, head_sha, archive in iter_repository_archives(repo_names, max_memory, prefetch, session,
+                                                                 store=store, api_base=api_base,
+                                                                 resolve_heads=True, state=state):
+        if archive is None:
+            results[repo_name] = None
+            continue
+        try:
+            results[repo_name] = analyze_repository_archive(repo_name, archive, output_dir, **extractor_options)
+            if state is not None and head_sha:
+                state.record_scan(repo_name, head_sha)
+        except Exception as e:
+            print(f"❌ 分析 {repo_name} 時發生錯誤: {e}")
+            results[repo_name] = None
+    return results
+
+# 默認的代碼搜索查詢
+SEARCH_QUERY = "cipher+AES.new+AES.MODE_ECB+language:python"
+
+# 代碼搜索每頁結果數（API 上限為 100）
+SEARCH_PER_PAGE = 100
+
+class RateLimiter:
+    """
+    根據 GitHub 響應頭自適應限速，可在多個線程間共用
+    
+    - 剩餘配額較少時，把剩餘請求平均分配到配額重置之前
+    - 遇到限速時優先遵守 Retry-After，其次等待到 X-RateLimit-Reset，
+      都沒有時按指數退避
+    - 只有 429，或帶 Retry-After / X-RateLimit-Remaining 為 0 的 403 視為限速；
+      其他 403（令牌無效、無權訪問資源）不重試，直接返回給調用方
+    """
+    
+    def __init__(self, low_watermark=5, max_backoff=300):
+        """
+        參數:
+            low_watermark (int): 剩餘配額低於此值時開始平攤等待
+            max_backoff (float): 指數退避的最長等待秒數
+        """
+        self.low_watermark = low_watermark
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self._backoff = 1.0
+        self.remaining = None
+        self.reset_at = None
+    
+    def wait(self):
+        """阻塞直到允許發送下一個請求"""
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+    
+    def _delay_until(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.time() + seconds)
+    
+    @staticmethod
+    def _retry_after_seconds(value):
+        """解析 Retry-After（秒數或 HTTP 日期）"""
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+    
+    @staticmethod
+    def is_rate_limited(response):
+        """響應是否因限速被拒絕"""
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return ("Retry-After" in response.headers or
+                response.headers.get("X-RateLimit-Remaining") == "0")
+    
+    def update(self, response):
+        """
+        根據響應更新限速狀態
         
-        # 檢查是否找到結果
-        if "total_count" not in search_results or search_results["total_count"] == 0:
-            print("未找到符合條件的存儲庫")
-            return
+        返回:
+            bool: 響應是否因限速被拒絕、應在等待後重試
+        """
+        response_headers = response.headers
+        remaining = response_headers.get("X-RateLimit-Remaining")
+        reset = response_headers.get("X-RateLimit-Reset")
+        with self._lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
         
-        print(f"找到 {search_results['total_count']} 個符合條件的結果")
+        if self.is_rate_limited(response):
+            retry_after = response_headers.get("Retry-After")
+            delay = self._retry_after_seconds(retry_after) if retry_after else None
+            if delay is None and self.remaining == 0 and self.reset_at:
+                delay = max(0.0, self.reset_at - time.time()) + 1
+            if delay is None:
+                with self._lock:
+                    delay = self._backoff
+                    self._backoff = min(self._backoff * 2, self.max_backoff)
+            print(f"⏳ 觸發速率限制，等待 {delay:.0f} 秒")
+            self._delay_until(delay)
+            return True
         
-        # 顯示前 10 個結果
-        max_results = min(20, search_results["total_count"])
-        for i in range(max_results):
-            if i >= len(search_results["items"]):
+        with self._lock:
+            self._backoff = 1.0
+        if self.remaining is not None and self.reset_at and self.remaining < self.low_watermark:
+            # 剩餘配額不多時平攤到重置之前，避免被拒絕
+            window = max(0.0, self.reset_at - time.time())
+            self._delay_until(window / max(self.remaining, 1))
+        return False
+
+# 爬取狀態數據庫的默認位置
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawl_state.sqlite3")
+
+class CrawlState:
+    """
+    持久化的爬取狀態（SQLite），可在多個線程間共用
+    
+    - responses: 每個 URL 最近一次響應的 ETag、正文和下一頁地址，用於條件請求
+    - search_items: 見過的搜索結果 (存儲庫, 路徑) 及其文件 SHA
+    - repositories: 每個存儲庫最近一次掃描時的提交 SHA
+    """
+    
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        """
+        參數:
+            path (str): SQLite 數據庫文件路徑
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY, etag TEXT, body TEXT, next_url TEXT, fetched_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS search_items (
+                    repo TEXT, path TEXT, sha TEXT, first_seen REAL, last_seen REAL,
+                    PRIMARY KEY (repo, path)
+                );
+                CREATE TABLE IF NOT EXISTS repositories (
+                    full_name TEXT PRIMARY KEY, commit_sha TEXT, scanned_at REAL
+                );
+            """)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def get_response(self, url):
+        """返回 URL 緩存的響應 {'etag', 'body', 'next_url'}，沒有時為 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, body, next_url FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'body': row[1], 'next_url': row[2]}
+    
+    def save_response(self, url, etag, body, next_url=None):
+        """保存 URL 的 ETag 和響應正文"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, body, next_url, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, body, next_url, time.time()))
+    
+    def mark_seen(self, item):
+        """
+        記錄搜索結果項
+        
+        返回:
+            bool: 是否為新結果（從未見過，或文件 SHA 已變化）
+        """
+        key = (item["repository"]["full_name"], item["path"])
+        sha = item.get("sha")
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT sha FROM search_items WHERE repo = ? AND path = ?", key).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO search_items (repo, path, sha, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)",
+                    (*key, sha, now, now))
+                return True
+            self._conn.execute(
+                "UPDATE search_items SET sha = ?, last_seen = ? WHERE repo = ? AND path = ?",
+                (sha, now, *key))
+            return row[0] != sha
+    
+    def last_scanned_sha(self, full_name):
+        """返回存儲庫最近一次掃描時的提交 SHA"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT commit_sha FROM repositories WHERE full_name = ?", (full_name,)).fetchone()
+        return row[0] if row else None
+    
+    def record_scan(self, full_name, commit_sha):
+        """記錄存儲庫已按該提交 SHA 掃描"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO repositories (full_name, commit_sha, scanned_at) VALUES (?, ?, ?)",
+                (full_name, commit_sha, time.time()))
+
+def request_with_rate_limit(session, url, rate_limiter=None, max_retries=5, **kwargs):
+    """
+    發送 GET 請求，被限速時按 RateLimiter 的建議等待後重試
+    
+    返回:
+        requests.Response: 最後一次的響應
+    """
+    rate_limiter = rate_limiter or RateLimiter()
+    for attempt in range(max_retries + 1):
+        rate_limiter.wait()
+        response = session.get(url, **kwargs)
+        if not rate_limiter.update(response) or attempt == max_retries:
+            return response
+        response.close()
+    return response
+
+def conditional_get(session, url, state=None, rate_limiter=None, extra_headers=None):
+    """
+    帶 If-None-Match 的條件請求，304 時使用 CrawlState 中保存的正文（不消耗速率配額）
+    
+    返回:
+        tuple: (響應正文, 下一頁地址或 None, 是否來自緩存)
+    """
+    request_headers = dict(extra_headers or {})
+    cached = state.get_response(url) if state is not None else None
+    if cached and cached['etag']:
+        request_headers["If-None-Match"] = cached['etag']
+    
+    response = request_with_rate_limit(session, url, rate_limiter, headers=request_headers)
+    if response.status_code == 304 and cached:
+        return cached['body'], cached['next_url'], True
+    response.raise_for_status()
+    
+    next_url = response.links.get("next", {}).get("url")
+    body = response.text
+    etag = response.headers.get("ETag")
+    if state is not None and etag:
+        state.save_response(url, etag, body, next_url)
+    return body, next_url, False
+
+def fetch_head_sha(full_name, session=None, state=None, rate_limiter=None, api_base=API_BASE, branch="HEAD"):
+    """
+    查詢存儲庫分支的最新提交 SHA（條件請求，未變化時不消耗配額）
+    
+    branch 默認為 HEAD，由 GitHub 解析為存儲庫的默認分支，無需先查詢分支名
+    
+    返回:
+        str: 提交 SHA，失敗時為 None
+    """
+    own_session = session is None
+    session = session or create_session()
+    url = f"{api_base}/repos/{full_name}/commits/{branch}"
+    try:
+        body, _, _ = conditional_get(session, url, state, rate_limiter,
+                                     {"Accept": "application/vnd.github.sha"})
+        return body.strip()
+    except requests.exceptions.RequestException as e:
+        print(f"查詢 {full_name} 的最新提交時出錯: {str(e)}")
+        return None
+    finally:
+        if own_session:
+            session.close()
+
+def resolve_head_shas(full_names, session=None, state=None, rate_limiter=None, api_base=API_BASE):
+    """
+    解析每個存儲庫默認分支的最新提交 SHA；提供 state 時跳過自上次掃描以來沒有新提交的存儲庫
+    
+    返回:
+        list: [(存儲庫名稱, 最新提交 SHA)]，查詢失敗的存儲庫也會保留（SHA 為 None）
+    """
+    changed = []
+    for full_name in full_names:
+        head_sha = fetch_head_sha(full_name, session, state, rate_limiter, api_base)
+        if state is not None and head_sha is not None and head_sha == state.last_scanned_sha(full_name):
+            print(f"⏭️ {full_name} 自上次掃描以來沒有變化，跳過下載")
+            continue
+        changed.append((full_name, head_sha))
+    return changed
+
+def iter_code_search(query=SEARCH_QUERY, session=None, per_page=SEARCH_PER_PAGE, max_pages=None,
+                     rate_limiter=None, api_base=API_BASE, on_total=None, state=None, stop=None):
+    """
+    分頁執行代碼搜索，沿 Link 響應頭翻頁，結果到達即逐條產生
+    
+    參數:
+        query (str): 搜索查詢（以 + 分隔關鍵字，與 URL 中的寫法一致）
+        session (requests.Session, optional): 共用的 HTTP 會話
+        per_page (int): 每頁結果數
+        max_pages (int, optional): 最多讀取的頁數
+        rate_limiter (RateLimiter, optional): 共用的限速器
+        api_base (str, optional): GitHub API 地址
+        on_total (callable, optional): 讀到第一頁後以 (query, total_count) 調用
+        state (CrawlState, optional): 爬取狀態，提供時以 ETag 發送條件請求
+        stop (threading.Event, optional): 設置後不再請求下一頁
+    
+    返回:
+        generator: 逐條產生搜索結果項
+    """
+    own_session = session is None
+    session = session or create_session()
+    rate_limiter = rate_limiter or RateLimiter()
+    url = f"{api_base}/search/code?q={query}&per_page={per_page}"
+    pages = 0
+    try:
+        while url and not (stop is not None and stop.is_set()):
+            body, next_url, _ = conditional_get(session, url, state, rate_limiter)
+            page = json.loads(body)
+            if pages == 0:
+                print(f"找到 {page.get('total_count', 0)} 個符合條件的結果")
+                if on_total is not None:
+                    on_total(query, page.get('total_count', 0))
+            yield from page.get("items", [])
+            
+            pages += 1
+            if max_pages is not None and pages >= max_pages:
                 break
-                
-            item = search_results["items"][i]
+            url = next_url
+    finally:
+        if own_session:
+            session.close()
+
+# 搜索 API 對單個查詢最多返回的結果數
+SEARCH_RESULT_CAP = 1000
+
+# 同一邏輯查詢的關鍵字變體
+SEARCH_KEYWORD_VARIANTS = [
+    "cipher+AES.new+AES.MODE_ECB",
+    "AES.MODE_ECB",
+    "MODE_ECB",
+    "AES.new+mode%3D1"
+]
+
+# 按文件大小切分查詢的區間（字節，代碼搜索只索引 384 KB 以下的文件）
+SEARCH_SIZE_SHARDS = [
+    (0, 1000), (1001, 2000), (2001, 4000), (4001, 8000),
+    (8001, 16000), (16001, 32000), (32001, 64000), (64001, 384000)
+]
+
+def shard_queries(keyword_variants=SEARCH_KEYWORD_VARIANTS, size_ranges=SEARCH_SIZE_SHARDS,
+                  qualifiers="language:python", paths=None):
+    """
+    將一個邏輯查詢拆分為多個子查詢，使每個子查詢的結果數低於搜索 API 的上限
+    
+    參數:
+        keyword_variants (list): 關鍵字變體
+        size_ranges (list): 文件大小區間 (下限, 上限)
+        qualifiers (str): 所有子查詢共用的限定條件
+        paths (list, optional): 額外按 path: 限定拆分
+    
+    返回:
+        list: 子查詢字符串（以 + 分隔）
+    """
+    queries = []
+    for keywords in keyword_variants:
+        for low, high in size_ranges:
+            for path in (paths or [None]):
+                parts = [keywords, qualifiers, f"size:{low}..{high}"]
+                if path:
+                    parts.append(f"path:{path}")
+                queries.append("+".join(part for part in parts if part))
+    return queries
+
+def search_sharded(queries, session=None, max_workers=3, rate_limiter=None, api_base=API_BASE,
+                   max_pages=None, state=None, only_new=False):
+    """
+    並發執行多個子查詢，共用限速器，按 (存儲庫, 文件路徑) 去重後逐條產生結果
+    
+    參數:
+        queries (list): 子查詢列表（見 shard_queries）
+        session (requests.Session, optional): 共用的 HTTP 會話
+        max_workers (int): 同時執行的子查詢數
+        rate_limiter (RateLimiter, optional): 共用的限速器
+        api_base (str, optional): GitHub API 地址
+        max_pages (int, optional): 每個子查詢最多讀取的頁數
+        state (CrawlState, optional): 爬取狀態，用於條件請求並記錄見過的結果
+        only_new (bool): 只產生 state 中未見過（或文件已變化）的結果
+    
+    返回:
+        generator: 去重後的搜索結果項
+    """
+    own_session = session is None
+    session = session or create_session(max(SESSION_POOL_SIZE, max_workers))
+    rate_limiter = rate_limiter or RateLimiter()
+    results = queue.Queue(maxsize=SEARCH_PER_PAGE * max_workers)
+    stop = threading.Event()
+    done = object()
+    
+    def warn_if_capped(query, total):
+        if total > SEARCH_RESULT_CAP:
+            print(f"⚠️ 子查詢 {query} 有 {total} 個結果，超過上限 {SEARCH_RESULT_CAP}，請進一步拆分")
+    
+    def put(entry):
+        # 調用方停止讀取時放棄寫入，避免線程阻塞
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def crawl(query):
+        # 調用方已停止讀取時，排隊中的子查詢不再發出請求
+        if stop.is_set():
+            return
+        try:
+            for item in iter_code_search(query, session, max_pages=max_pages, rate_limiter=rate_limiter,
+                                         api_base=api_base, on_total=warn_if_capped, state=state, stop=stop):
+                if not put(item):
+                    return
+        except requests.exceptions.RequestException as e:
+            print(f"子查詢 {query} 出錯: {str(e)}")
+        finally:
+            put(done)
+    
+    seen = set()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for query in queries:
+            executor.submit(crawl, query)
+        finished = 0
+        while finished < len(queries):
+            item = results.get()
+            if item is done:
+                finished += 1
+                continue
+            key = (item["repository"]["full_name"], item["path"])
+            if key in seen:
+                continue
+            seen.add(key)
+            is_new = state.mark_seen(item) if state is not None else True
+            if only_new and not is_new:
+                continue
+            yield item
+    finally:
+        # 提前停止時取消未開始的子查詢，正在運行的子查詢在當前頁結束後退出
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        if own_session:
+            session.close()
+    print(f"共 {len(seen)} 個不重複的搜索結果")
+
+# 批處理模式的默認輸出目錄
+DEFAULT_BATCH_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_output")
+
+def collect_repositories(items, max_repos=None, results_path=None):
+    """
+    從搜索結果中按出現順序收集不重複的存儲庫名稱
+    
+    參數:
+        items (iterable): 搜索結果項
+        max_repos (int, optional): 最多收集的存儲庫數量
+        results_path (str, optional): 同時把搜索結果逐條追加保存到此 JSONL 文件
+    
+    返回:
+        list: 存儲庫名稱列表
+    """
+    repo_names = []
+    results_file = open(results_path, "w", encoding="utf-8") if results_path else None
+    try:
+        for item in items:
+            if results_file:
+                results_file.write(json.dumps(item) + "\n")
+            repo_name = item["repository"]["full_name"]
+            if repo_name not in repo_names:
+                repo_names.append(repo_name)
+                if max_repos and len(repo_names) >= max_repos:
+                    break
+    finally:
+        # 提前停止時關閉生成器，讓分片搜索的線程退出
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
+        if results_file:
+            results_file.close()
+    return repo_names
+
+def open_oracle(oracle_path, timeout=None, pool=None):
+    """
+    加載生成的 Oracle，返回可作為加密函數使用的上下文管理器
+    
+    提供沙箱進程池時在池中預熱的工作進程裡加載，否則啟動一個獨立的工作進程
+    """
+    if pool is not None:
+        return pool.oracle(oracle_path)
+    return OracleClient(oracle_path, timeout=timeout)
+
+def run_oracle(oracle_path, plaintexts, timeout=None, pool=None):
+    """
+    在一個常駐的 Oracle 工作進程中批量加密所有明文（只加載一次 Oracle 文件，重複的明文只加密一次）
+    
+    返回:
+        list: 十六進制密文列表，Oracle 無法加載或調用失敗時為 None
+    """
+    try:
+        with open_oracle(oracle_path, timeout, pool) as client:
+            oracle = OracleCache(client)
+            ciphertexts = oracle.encrypt_batch(plaintext.encode("utf-8") for plaintext in plaintexts)
+    except OracleError as e:
+        print(f"❌ 運行 Oracle {oracle_path} 時出錯: {e}")
+        return None
+    return [ciphertext.hex() for ciphertext in ciphertexts]
+
+def run_attack(oracle_path, timeout=None, max_queries=None, pool=None):
+    """
+    對生成的 Oracle 運行 ECB 逐字節攻擊
+    
+    返回:
+        dict: 恢復的秘密（十六進制）、Oracle 往返次數、明文查詢數和耗時，失敗時為 None
+    """
+    try:
+        with open_oracle(oracle_path, timeout, pool) as oracle:
+            result = recover_secret(oracle, max_queries=max_queries)
+    except (OracleError, QueryBudgetExceeded, ValueError) as e:
+        print(f"❌ 攻擊 Oracle {oracle_path} 時出錯: {e}")
+        return None
+    print(f"🔓 恢復 {len(result.secret)} 字節, Oracle 往返 {result.oracle_calls} 次, 耗時 {result.seconds:.3f} 秒")
+    return {'secret': result.secret.hex(), 'oracle_calls': result.oracle_calls,
+            'queries': result.queries, 'seconds': round(result.seconds, 3)}
+
+def run_batch(args):
+    """
+    批處理模式：搜索 → 下載 → 提取 → 批量調用 Oracle，全程無交互
+    
+    結果摘要（含每小時處理的存儲庫數）寫入 <output_dir>/batch_summary.json
+    
+    返回:
+        dict: 批處理摘要
+    """
+    started = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+    session = create_session(max(SESSION_POOL_SIZE, args.download_workers))
+    state = None if args.no_state else CrawlState(args.state_path)
+    store = None if args.no_mirror else BlobStore(args.mirror_dir, args.mirror_max_mb * 1024 * 1024,
+                                                  args.mirror_keep_zipballs)
+    
+    plaintexts = list(args.plaintext or [])
+    if args.plaintexts_file:
+        with open(args.plaintexts_file, encoding="utf-8") as f:
+            plaintexts.extend(line.rstrip("\n") for line in f if line.strip())
+    
+    # 所有存儲庫共用的重複文件索引，fork 和複製的文件只分析一次
+    dedup_index = None if args.no_dedup else DuplicateIndex()
+    pool = None
+    sandbox_error = None
+    extractor_options = dict(
+        prefilter=args.prefilter,
+        workers=args.workers,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        low_memory=args.low_memory,
+        dedup_index=dedup_index
+    )
+    
+    try:
+        if args.repos:
+            repo_names = list(dict.fromkeys(args.repos))[:args.max_repos or None]
+        else:
+            queries = args.query or shard_queries()
+            items = search_sharded(queries, session, api_base=args.api_base, max_pages=args.max_pages,
+                                   state=state, only_new=args.only_new)
+            repo_names = collect_repositories(items, args.max_repos,
+                                              os.path.join(args.output_dir, "search_results.jsonl"))
+        print(f"\n批處理 {len(repo_names)} 個存儲庫")
+        
+        if args.bandit:
+            # Bandit 需要磁盤上的 ZIP 文件，因此先下載再逐個掃描和分析
+            head_shas = dict(resolve_head_shas(repo_names, session, state, api_base=args.api_base))
+            oracles = {}
+            for record in download_repositories(list(head_shas), args.output_dir, args.download_workers, session,
+                                                args.api_base, refs=head_shas, store=store):
+                repo_name = record['full_name']
+                oracles[repo_name] = None
+                if record['error']:
+                    continue
+                try:
+                    run(record['path'])
+                    oracles[repo_name] = analyze_repository_archive(repo_name, record['path'], args.output_dir,
+                                                                    **extractor_options)
+                    if state is not None and head_shas.get(repo_name):
+                        state.record_scan(repo_name, head_shas[repo_name])
+                except Exception as e:
+                    print(f"❌ 分析 {repo_name} 時發生錯誤: {e}")
+        else:
+            oracles = run_pipeline(repo_names, args.output_dir, prefetch=args.prefetch, session=session,
+                                   state=state, store=store, api_base=args.api_base, **extractor_options)
+        
+        generated = {name: path for name, path in oracles.items() if path}
+        if generated and (plaintexts or args.attack) and not args.no_sandbox:
+            # 生成的 Oracle 是不可信代碼，在預熱的沙箱工作進程中運行，每個進程只服務一個存儲庫
+            limits = SandboxLimits(cpu_seconds=args.oracle_cpu_seconds, memory_mb=args.oracle_memory_mb,
+                                   require_network_isolation=not args.oracle_allow_unisolated)
+            try:
+                pool = OraclePool(args.oracle_workers, limits, timeout=args.oracle_timeout)
+            except OracleError as e:
+                # 沙箱無法啟動（例如無法建立網絡隔離）時保留提取結果，只跳過運行 Oracle 的階段
+                sandbox_error = str(e)
+                print(f"❌ 無法啟動 Oracle 沙箱，跳過 Oracle 和攻擊階段: {e}")
+        workers = pool.size if pool is not None else 1
+        
+        ciphertexts = {}
+        if plaintexts and sandbox_error is None:
+            def encrypt_repository(repo_name):
+                print(f"\n開始對 {repo_name} 執行 Oracle...")
+                return run_oracle(generated[repo_name], plaintexts, args.oracle_timeout, pool)
+            with ThreadPoolExecutor(workers) as executor:
+                ciphertexts = dict(zip(generated, executor.map(encrypt_repository, generated)))
+        
+        attacks = {}
+        if args.attack and sandbox_error is None:
+            def attack_repository(repo_name):
+                print(f"\n開始對 {repo_name} 運行逐字節攻擊...")
+                return run_attack(generated[repo_name], args.oracle_timeout, args.attack_max_queries, pool)
+            with ThreadPoolExecutor(workers) as executor:
+                attacks = dict(zip(generated, executor.map(attack_repository, generated)))
+    finally:
+        if pool is not None:
+            pool.close()
+        if state is not None:
+            state.close()
+        session.close()
+    
+    elapsed = time.perf_counter() - started
+    summary = {
+        'repositories': len(oracles),
+        'oracles': sum(1 for path in oracles.values() if path),
+        'skipped': len(repo_names) - len(oracles),
+        'seconds': round(elapsed, 2),
+        'repos_per_hour': round(len(oracles) * 3600 / elapsed, 2) if elapsed > 0 else None,
+        'results': {name: {'oracle': path, 'ciphertexts': ciphertexts.get(name), 'attack': attacks.get(name)}
+                    for name, path in oracles.items()}
+    }
+    if sandbox_error is not None:
+        summary['sandbox'] = {'error': sandbox_error}
+    elif pool is not None:
+        summary['sandbox'] = pool.stats()
+        if pool.unisolated:
+            print(f"⚠️ {pool.unisolated} 個 Oracle 工作進程沒有網絡隔離")
+    if dedup_index is not None:
+        # 同一個加密相關文件出現在哪些存儲庫中
+        summary['shared_crypto_files'] = [
+            {'locations': [list(location) for location in locations],
+             'repositories': dedup_index.projects_containing(key)}
+            for key, locations in dedup_index.duplicates().items()
+            if dedup_index.results[key]['is_crypto']
+        ]
+    with open(os.path.join(args.output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    
+    print(f"\n✨ 批處理完成: {summary['repositories']} 個存儲庫, 生成 {summary['oracles']} 個 Oracle 文件, "
+          f"跳過 {summary['skipped']} 個未變化的存儲庫")
+    print(f"耗時 {elapsed:.1f} 秒, 吞吐量 {summary['repos_per_hour']} 個存儲庫/小時")
+    return summary
+
+def parse_args(argv=None):
+    """
+    解析命令行參數；--config 指定的 JSON 文件提供默認值，命令行參數優先
+    
+    JSON 的鍵與參數名相同（例如 {"max_repos": 50, "plaintext": ["YELLOW SUBMARINE"]}）
+    """
+    parser = argparse.ArgumentParser(description="搜索 GitHub 上的 ECB 加密代碼並生成 Oracle 文件")
+    parser.add_argument('--batch', action='store_true', help="無交互批處理模式")
+    parser.add_argument('--config', help="JSON 配置文件")
+    parser.add_argument('--max-repos', type=int, help="最多處理的存儲庫數量")
+    parser.add_argument('--repos', nargs='+', help="直接處理這些存儲庫，不進行搜索")
+    parser.add_argument('--query', action='append', help="代碼搜索查詢（可重複），默認使用分片查詢")
+    parser.add_argument('--max-pages', type=int, help="每個查詢最多讀取的頁數")
+    parser.add_argument('--only-new', action='store_true', help="只處理之前未見過的搜索結果")
+    parser.add_argument('--api-base', default=API_BASE, help="GitHub API 地址（測試時可指向本地的替身服務）")
+    parser.add_argument('--output-dir', default=DEFAULT_BATCH_OUTPUT_DIR, help="批處理輸出目錄")
+    parser.add_argument('--state-path', default=DEFAULT_STATE_PATH, help="爬取狀態數據庫路徑")
+    parser.add_argument('--no-state', action='store_true', help="不讀寫爬取狀態")
+    parser.add_argument('--mirror-dir', default=DEFAULT_MIRROR_DIR, help="本地內容尋址鏡像目錄")
+    parser.add_argument('--mirror-max-mb', type=int, default=MIRROR_MAX_BYTES // (1024 * 1024),
+                        help="本地鏡像大小上限（MB）")
+    parser.add_argument('--mirror-keep-zipballs', action='store_true',
+                        help="本地鏡像同時保存完整的 zipball（默認只保存 .py 文件和文件清單）")
+    parser.add_argument('--no-mirror', action='store_true', help="不使用本地鏡像")
+    parser.add_argument('--bandit', action='store_true', help="下載到磁盤並運行 Bandit 掃描")
+    parser.add_argument('--prefetch', type=int, default=1, help="流水線模式下提前下載的存儲庫數量")
+    parser.add_argument('--download-workers', type=int, default=4, help="Bandit 模式下的並發下載數")
+    parser.add_argument('--prefilter', choices=EncryptionExtractor.PREFILTER_MODES, default='text',
+                        help="加密文件預篩選模式")
+    parser.add_argument('--workers', type=int, default=1, help="並行分析的進程數")
+    parser.add_argument('--cache-dir', help="提取結果緩存目錄，指定後才啟用緩存")
+    parser.add_argument('--no-cache', action='store_true', help="不讀寫提取結果緩存（覆蓋 --cache-dir）")
+    parser.add_argument('--low-memory', action='store_true', help="不保留源碼和AST，生成時按需讀取代碼片段")
+    parser.add_argument('--no-dedup', action='store_true', help="不在存儲庫之間復用重複文件的分析結果")
+    parser.add_argument('--plaintext', action='append', help="傳給 Oracle 加密的明文（可重複）")
+    parser.add_argument('--plaintexts-file', help="每行一個明文的文件")
+    parser.add_argument('--attack', action='store_true', help="對生成的 Oracle 運行 ECB 逐字節攻擊")
+    parser.add_argument('--attack-max-queries', type=int, help="每個 Oracle 的攻擊查詢預算（明文數）")
+    parser.add_argument('--oracle-timeout', type=float, default=300, help="等待每個 Oracle 響應的超時秒數")
+    parser.add_argument('--oracle-workers', type=int, default=2, help="沙箱進程池中預先啟動的 Oracle 工作進程數")
+    parser.add_argument('--oracle-cpu-seconds', type=int, default=SandboxLimits().cpu_seconds,
+                        help="每個 Oracle 可用的 CPU 秒數")
+    parser.add_argument('--oracle-memory-mb', type=int, default=SandboxLimits().memory_mb,
+                        help="每個 Oracle 工作進程的內存上限（MB）")
+    parser.add_argument('--oracle-allow-unisolated', action='store_true',
+                        help="無法建立網絡命名空間時仍在沙箱中運行 Oracle（默認拒絕運行）")
+    parser.add_argument('--no-sandbox', action='store_true', help="不使用沙箱進程池，直接為每個 Oracle 啟動工作進程")
+    
+    config_args, _ = parser.parse_known_args(argv)
+    if config_args.config:
+        with open(config_args.config, encoding="utf-8") as f:
+            parser.set_defaults(**json.load(f))
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch:
+        run_batch(args)
+        return
+    
+    # 步驟1：搜索包含特定代碼的存儲庫
+    queries = args.query or shard_queries()
+    session = create_session()
+    state = CrawlState(args.state_path)
+    store = None if args.no_mirror else BlobStore(args.mirror_dir, args.mirror_max_mb * 1024 * 1024,
+                                                  args.mirror_keep_zipballs)
+    # 逐頁讀取搜索結果，每條結果到達時即追加保存
+    results_file = open("search_results.jsonl", "w", encoding="utf-8")
+    
+    try:
+        print(f"搜索 {len(queries)} 個子查詢:")
+        for query in queries:
+            print(f"   - {query}")
+        
+        found = False
+        for i, item in enumerate(search_sharded(queries, session, state=state)):
+            found = True
+            results_file.write(json.dumps(item) + "\n")
+            results_file.flush()
+            
             repo_name = item["repository"]["full_name"]
             file_path = item["path"]
             #stargazers = item["repository"]["stargazers_count"]
@@ -100,13 +1341,11 @@ def main():
             
             download_option = input("是否下載此存儲庫？(y/n): ")
             if download_option.lower() == "y":
-                # 創建目錄來保存所有下載和結果
+                # 下載存儲庫（固定到提交時保存在本地鏡像中，否則保存到存儲庫同名目錄）
                 script_dir = os.path.dirname(os.path.abspath(__file__))
-                downloads_dir = os.path.join(script_dir, search_results["items"][i]["repository"]["full_name"].replace("/", "_"))
-                os.makedirs(downloads_dir, exist_ok=True)
-
-                # 下載存儲庫
-                zip_file_path = download_repository(repo_name, downloads_dir)
+                downloads_dir = os.path.join(script_dir, repo_name.replace("/", "_"))
+                head_sha = fetch_head_sha(repo_name, session, state)
+                zip_file_path = download_repository(repo_name, downloads_dir, session, ref=head_sha, store=store)
                 
                 if zip_file_path:
                     # 運行 Bandit 掃描
@@ -120,12 +1359,12 @@ def main():
                     print("加密代碼提取器")
                     print("=" * 50)
                     
-                    # 獲取項目路徑
-                    project_path = input("請輸入項目目錄路徑: ").strip()
+                    # 獲取項目路徑（默認直接分析下載的 ZIP，無需解壓）
+                    project_path = input(f"請輸入項目目錄或 ZIP 文件路徑 [預設: {zip_file_path}]: ").strip() or zip_file_path
                     
-                    # 檢查目錄是否存在
-                    if not os.path.isdir(project_path):
-                        print(f"❌ 錯誤: 目錄 '{project_path}' 不存在")
+                    # 檢查目錄或壓縮包是否存在
+                    if not (os.path.isdir(project_path) or zipfile.is_zipfile(project_path)):
+                        print(f"❌ 錯誤: 目錄或 ZIP 文件 '{project_path}' 不存在")
                         return
                     
                     # 設定輸出文件路徑
@@ -159,25 +1398,40 @@ def main():
                         import traceback
                         traceback.print_exc()
 
-                    #執行 ecb_exploiter.py
-                    print("\n開始執行 exploiter...")
-                    plaintext = input("請輸入明文: ")
-                    while plaintext:
-                        subprocess.run(["python", "ecb_exploiter.py", "demo", "--plaintext", plaintext])
-                        print('繼續輸入明文，或按 Enter 鍵結束')
-                        plaintext = input("請輸入明文: ")
-                    print("\nexploiter 執行完畢!")
+                    # 在沙箱中啟動常駐的 Oracle 工作進程，Oracle 文件只加載一次
+                    print("\n開始執行 Oracle...")
+                    try:
+                        with SandboxedClient(output_file) as client:
+                            # 重複輸入的明文直接從緩存回答
+                            oracle = OracleCache(client)
+                            plaintext = input("請輸入明文: ")
+                            while plaintext:
+                                print(f"密文: {oracle(plaintext.encode('utf-8')).hex()}")
+                                print('繼續輸入明文，或按 Enter 鍵結束')
+                                plaintext = input("請輸入明文: ")
+                    except OracleError as e:
+                        print(f"❌ 運行 Oracle 時出錯: {e}")
+                    print("\nOracle 執行完畢!")
 
             # 提示用戶是否繼續查看下一個結果
             continue_option = input("\n是否繼續查看下一個結果？(y/n): ")
             if continue_option.lower() != "y":
                 break
+        
+        # 檢查是否找到結果
+        if not found:
+            print("未找到符合條件的存儲庫")
     
     except requests.exceptions.RequestException as e:
         print(f"API 請求出錯: {str(e)}")
     
     except Exception as e:
         print(f"發生未預期的錯誤: {str(e)}")
+    
+    finally:
+        results_file.close()
+        state.close()
+        session.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+ECB 逐字節攻擊引擎（byte-at-a-time）
+
+給定一個加密 Oracle：E(明文) = ECB(前綴 || 明文 || 秘密 || 填充)，逐字節恢復秘密。
+Oracle 是任意接受 bytes、返回密文 bytes 的函數，例如 oracle_worker.OracleClient
+或 oracle_worker.load_oracle 加載的函數。
+
+查詢次數優化:
+- 默認把 256 個候選塊放進同一個明文，一次查詢得到整個字典和目標塊（ECB 各塊獨立加密）
+- 字典按前 (塊大小 - 1) 個已知字節緩存，重複出現的前綴不再查詢
+- 分組大小、前綴長度和秘密長度由 OracleProbe 探測，所有查詢經過它記憶化並受查詢預算限制
+- 確認是 ECB 後啟用 OracleCache 的分組緩存，目標明文等查詢可由已知分組直接拼出
+"""
+import sys
+import time
+import argparse
+from typing import NamedTuple, Optional
+
+from oracle_cache import OracleCache
+from oracle_probe import OracleProbe, QueryBudgetExceeded
+from oracle_sandbox import SandboxedClient
+from oracle_worker import OracleClient, OracleError
+
+
+class AttackResult(NamedTuple):
+    """攻擊結果"""
+    secret: bytes
+    oracle_calls: int  # Oracle 往返次數（批量查詢算一次）
+    queries: int       # 加密的明文總數
+    seconds: float
+
+
+class CountingOracle:
+    """包裝加密函數並統計調用次數；底層支持 encrypt_batch 時批量查詢"""
+
+    def __init__(self, oracle):
+        self.oracle = oracle
+        self.calls = 0
+        self.queries = 0
+
+    def __call__(self, plaintext):
+        self.calls += 1
+        self.queries += 1
+        return self.oracle(plaintext)
+
+    def encrypt_batch(self, plaintexts):
+        plaintexts = list(plaintexts)
+        self.queries += len(plaintexts)
+        encrypt_batch = getattr(self.oracle, 'encrypt_batch', None)
+        if encrypt_batch is not None:
+            self.calls += 1
+            return list(encrypt_batch(plaintexts))
+        self.calls += len(plaintexts)
+        return [self.oracle(plaintext) for plaintext in plaintexts]
+
+
+class ByteAtATimeAttack:
+    """
+    逐字節恢復 Oracle 附加在明文之後的秘密
+
+    用法:
+        attack = ByteAtATimeAttack(oracle)
+        result = attack.recover()
+        print(result.secret, result.oracle_calls)
+    """
+
+    def __init__(self, oracle, block_size: Optional[int] = None, prefix_length: Optional[int] = None,
+                 pack_candidates: bool = True, filler: bytes = b'A', max_queries: Optional[int] = None):
+        """
+        參數:
+            oracle: 接受明文 bytes、返回密文 bytes 的函數
+            block_size: 分組大小，None 時自動探測
+            prefix_length: Oracle 在明文前添加的固定前綴長度，None 時自動探測
+            pack_candidates: 把 256 個候選塊放進一個明文（每字節一次查詢）；
+                關閉時改為一次批量發送 256 個明文
+            filler: 填充字節
+            max_queries: 探測器發出的明文數上限（在響應緩存之前計數，因此是保守上限），
+                超出時拋出 QueryBudgetExceeded
+        """
+        self.oracle = oracle if isinstance(oracle, CountingOracle) else CountingOracle(oracle)
+        self.pack_candidates = pack_candidates
+        self.filler = filler
+        # 所有查詢都經過探測器和響應緩存，重複的明文不再發送給 Oracle
+        self.cache = OracleCache(self.oracle)
+        self.probe = OracleProbe(self.cache, max_queries, filler)
+        self.block_size = block_size or self.probe.block_size()
+        if prefix_length is None:
+            prefix_length = self.probe.prefix_length(self.block_size)
+        self.prefix_length = prefix_length
+        if self.probe.is_ecb(self.block_size):
+            self.cache.configure(self.block_size, self.prefix_length)
+        # 補齊前綴到分組邊界，之後輸入從第 start_block 個分組開始
+        self.alignment = self.filler * ((-prefix_length) % self.block_size)
+        self.start_block = (prefix_length + len(self.alignment)) // self.block_size
+        # 已知前綴 -> {候選塊密文: 字節}
+        self.dictionary_cache = {}
+        self.dictionary_hits = 0
+
+    def _block(self, ciphertext, index):
+        return ciphertext[index * self.block_size:(index + 1) * self.block_size]
+
+    def _target(self, pad_length):
+        """目標明文 (對齊 || 填充) 的密文，由探測器記憶化，每種填充長度只查詢一次"""
+        return self.probe(self.alignment + self.filler * pad_length)
+
+    def secret_length(self):
+        """秘密長度（假設 PKCS#7 填充），由分組大小探測時的密文長度變化推算"""
+        return self.probe.secret_length(self.block_size, self.prefix_length)
+
+    def _candidate_blocks(self, known):
+        return [known + bytes([candidate]) for candidate in range(256)]
+
+    def _recover_byte(self, recovered):
+        """恢復下一個字節，字典中找不到目標塊時返回 None"""
+        size = self.block_size
+        position = len(recovered)
+        pad_length = size - 1 - position % size
+        # 目標字節之前的 (分組大小 - 1) 個已知字節
+        known = (self.filler * pad_length + recovered)[-(size - 1):]
+        target_index = self.start_block + (pad_length + position) // size
+
+        dictionary = self.dictionary_cache.get(known)
+        if dictionary is not None:
+            self.dictionary_hits += 1
+            target_block = self._block(self._target(pad_length), target_index)
+        elif self.pack_candidates:
+            # 一個明文: 對齊 || 256 個候選塊 || 填充，字典和目標塊來自同一個密文
+            ciphertext = self.probe(self.alignment + b''.join(self._candidate_blocks(known))
+                                    + self.filler * pad_length)
+            dictionary = {self._block(ciphertext, self.start_block + candidate): candidate
+                          for candidate in range(256)}
+            target_block = self._block(ciphertext, target_index + 256)
+        else:
+            # 256 個候選明文和目標明文在一次批量查詢中發送（已記錄的目標明文不再發送）
+            plaintexts = [self.alignment + block for block in self._candidate_blocks(known)]
+            plaintexts.append(self.alignment + self.filler * pad_length)
+            ciphertexts = self.probe.encrypt_batch(plaintexts)
+            dictionary = {self._block(ciphertext, self.start_block): candidate
+                          for candidate, ciphertext in enumerate(ciphertexts[:256])}
+            target_block = self._block(ciphertexts[256], target_index)
+        self.dictionary_cache[known] = dictionary
+        return dictionary.get(target_block)
+
+    def recover(self, max_length: Optional[int] = None) -> AttackResult:
+        """
+        恢復秘密
+
+        參數:
+            max_length: 最多恢復的字節數，默認為推算出的秘密長度
+
+        返回:
+            AttackResult: 秘密、Oracle 往返次數、明文查詢總數和耗時
+        """
+        started = time.perf_counter()
+        length = self.secret_length()
+        if max_length is not None:
+            length = min(length, max_length)
+
+        recovered = b''
+        while len(recovered) < length:
+            byte = self._recover_byte(recovered)
+            if byte is None:
+                # 通常是到達了非 PKCS#7 填充的部分
+                break
+            recovered += bytes([byte])
+        return AttackResult(recovered, self.oracle.calls, self.oracle.queries,
+                            time.perf_counter() - started)
+
+
+def recover_secret(oracle, block_size: Optional[int] = None, prefix_length: Optional[int] = None,
+                   max_length: Optional[int] = None, pack_candidates: bool = True,
+                   max_queries: Optional[int] = None) -> AttackResult:
+    """對加密函數運行逐字節攻擊，返回 AttackResult"""
+    attack = ByteAtATimeAttack(oracle, block_size, prefix_length, pack_candidates, max_queries=max_queries)
+    return attack.recover(max_length)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="對生成的 Oracle 文件運行 ECB 逐字節攻擊")
+    parser.add_argument('oracle_path', help="Oracle 文件路徑（ecb_encrypt.py）")
+    parser.add_argument('--entry', help="入口函數名或 類名.方法名，默認自動查找")
+    parser.add_argument('--key', help="十六進制密鑰，作為加密函數的第二個參數")
+    parser.add_argument('--block-size', type=int, help="分組大小，默認自動探測")
+    parser.add_argument('--prefix-length', type=int, help="Oracle 添加的固定前綴長度，默認自動探測")
+    parser.add_argument('--max-queries', type=int, help="最多發送給 Oracle 的明文數")
+    parser.add_argument('--max-length', type=int, help="最多恢復的字節數")
+    parser.add_argument('--no-pack', action='store_true', help="不把候選塊合併到一個明文中，改為批量查詢")
+    parser.add_argument('--no-sandbox', action='store_true', help="不在資源受限、無網絡的沙箱中運行 Oracle")
+    args = parser.parse_args(argv)
+
+    client_class = OracleClient if args.no_sandbox else SandboxedClient
+    try:
+        with client_class(args.oracle_path, args.entry, bytes.fromhex(args.key) if args.key else None) as oracle:
+            result = recover_secret(oracle, args.block_size, args.prefix_length, args.max_length,
+                                    pack_candidates=not args.no_pack, max_queries=args.max_queries)
+    except (OracleError, QueryBudgetExceeded, ValueError) as e:
+        print(f"❌ 攻擊失敗: {e}")
+        return 1
+    print(f"🔓 恢復的秘密 ({len(result.secret)} 字節): {result.secret!r}")
+    print(f"📊 Oracle 往返 {result.oracle_calls} 次, 加密明文 {result.queries} 個, 耗時 {result.seconds:.3f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+密文語料的 ECB 分組重複檢測
+
+ECB 在同一密鑰下把相同的明文分組加密成相同的密文分組，因此密文中重複的分組
+是 ECB 使用的強信號。本模塊把密文字節零拷貝地視為 NumPy 分組數組（np.frombuffer
+加上 V16 的 void dtype），用排序和相鄰比較統計重複分組，與靜態的 EncryptionExtractor 互補。
+
+支持的輸入:
+- raw: 二進制文件，整個文件為一條記錄，或用 --record-size 按固定長度切分為多條記錄
+- hex / base64: 每行一條編碼後的密文（日誌、數據庫導出）
+
+大文件通過 mmap 分塊讀取，不把整個文件讀入內存。
+"""
+import sys
+import mmap
+import json
+import base64
+import binascii
+import argparse
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+BLOCK_SIZE = 16
+
+# 逐行記錄每批向量化評分的記錄數
+RECORD_BATCH_SIZE = 65536
+
+# 整個文件作為一條記錄時，每次處理的字節數
+STREAM_CHUNK_BYTES = 64 * 1024 * 1024
+
+# 整個文件作為一條記錄時，去重散列集合的內存上限
+STREAM_HASH_BYTES = 256 * 1024 * 1024
+
+
+class BlockStats(NamedTuple):
+    """一條記錄的分組重複統計"""
+    record: int
+    blocks: int
+    unique_blocks: int
+    repeated_blocks: int
+    score: float  # 重複分組佔比: repeated_blocks / blocks
+
+
+def _make_stats(record, blocks, unique_blocks):
+    repeated = blocks - unique_blocks
+    return BlockStats(record, blocks, unique_blocks, repeated, repeated / blocks if blocks else 0.0)
+
+
+def block_view(data, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """
+    把字節數據零拷貝地視為分組數組，每個元素是一個 block_size 字節的 void 值
+
+    不足一個分組的尾部字節被忽略
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    usable = len(buffer) - len(buffer) % block_size
+    return buffer[:usable].view(np.dtype((np.void, block_size)))
+
+
+def _hash_blocks(blocks: np.ndarray) -> np.ndarray:
+    """把 16 字節分組壓縮為 64 位散列（兩個 uint64 混合），用於超大文件的去重"""
+    words = blocks.view(np.uint64).reshape(-1, blocks.dtype.itemsize // 8)
+    hashes = words[:, 0].copy()
+    for column in range(1, words.shape[1]):
+        hashes *= np.uint64(0x9E3779B97F4A7C15)
+        hashes ^= words[:, column]
+    return hashes
+
+
+def _hash_partition(hashes: np.ndarray, partitions: int) -> np.ndarray:
+    """按乘法散列的高位把散列分到 partitions 個區間，分組內容不均勻時各區間的大小仍然接近"""
+    mixed = hashes * np.uint64(0x9E3779B97F4A7C15)
+    return (mixed >> np.uint64(32)) % np.uint64(partitions)
+
+
+def repetition_score(data, block_size: int = BLOCK_SIZE, record: int = 0) -> BlockStats:
+    """計算單條密文的分組重複統計"""
+    blocks = block_view(data, block_size)
+    return _make_stats(record, len(blocks), len(np.unique(blocks)))
+
+
+def score_fixed_records(data, record_size: int, block_size: int = BLOCK_SIZE,
+                        first_record: int = 0) -> List[BlockStats]:
+    """
+    對按固定長度排列的多條記錄一次性評分
+
+    記錄被重排為 (記錄數, 每條記錄的分組數) 的矩陣，逐行排序後比較相鄰分組
+    """
+    if record_size % block_size:
+        raise ValueError(f"記錄長度 {record_size} 不是分組大小 {block_size} 的整數倍")
+    blocks = block_view(data, block_size)
+    per_record = record_size // block_size
+    count = len(blocks) // per_record
+    if count == 0:
+        return []
+    matrix = np.sort(blocks[:count * per_record].reshape(count, per_record), axis=1)
+    repeated = (matrix[:, 1:] == matrix[:, :-1]).sum(axis=1)
+    return [_make_stats(first_record + i, per_record, per_record - int(r)) for i, r in enumerate(repeated)]
+
+
+def score_records(records: Iterable[bytes], block_size: int = BLOCK_SIZE,
+                  first_record: int = 0) -> List[BlockStats]:
+    """
+    對長度不一的多條記錄一次性評分
+
+    所有分組拼成一個數組，與記錄編號一起排序，同一記錄內相鄰且相等的分組即為重複
+    """
+    records = list(records)
+    lengths = np.array([len(record) // block_size for record in records], dtype=np.int64)
+    if not lengths.sum():
+        return [_make_stats(first_record + i, 0, 0) for i in range(len(records))]
+    data = b''.join(record[:length * block_size] for record, length in zip(records, lengths))
+    blocks = block_view(data, block_size)
+    owners = np.repeat(np.arange(len(records)), lengths)
+
+    # 先按分組內容、再按記錄編號穩定排序
+    order = np.argsort(blocks, kind='stable')
+    order = order[np.argsort(owners[order], kind='stable')]
+    sorted_blocks, sorted_owners = blocks[order], owners[order]
+    duplicate = (sorted_blocks[1:] == sorted_blocks[:-1]) & (sorted_owners[1:] == sorted_owners[:-1])
+    repeated = np.bincount(sorted_owners[1:][duplicate], minlength=len(records))
+    return [_make_stats(first_record + i, int(length), int(length - r))
+            for i, (length, r) in enumerate(zip(lengths, repeated))]
+
+
+def _map_file(path):
+    """以只讀 mmap 打開文件，空文件返回 b''"""
+    with open(path, 'rb') as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b''
+
+
+def scan_fixed_records(path, record_size: int, block_size: int = BLOCK_SIZE,
+                       batch_records: int = RECORD_BATCH_SIZE) -> Iterator[BlockStats]:
+    """通過 mmap 分批掃描由固定長度記錄組成的二進制文件"""
+    mapped = _map_file(path)
+    try:
+        batch_bytes = record_size * batch_records
+        for offset in range(0, len(mapped) - record_size + 1, batch_bytes):
+            view = memoryview(mapped)[offset:offset + batch_bytes]
+            try:
+                yield from score_fixed_records(view, record_size, block_size, offset // record_size)
+            finally:
+                view.release()
+    finally:
+        if isinstance(mapped, mmap.mmap):
+            mapped.close()
+
+
+def scan_stream(path, block_size: int = BLOCK_SIZE, chunk_bytes: int = STREAM_CHUNK_BYTES,
+                max_hash_bytes: int = STREAM_HASH_BYTES) -> BlockStats:
+    """
+    把整個文件作為一條密文評分，通過 mmap 分塊處理
+
+    分組壓縮為 64 位散列後逐塊用 np.union1d 合併到去重集合；散列碰撞的概率可以忽略。
+    文件的分組數超出 max_hash_bytes 能容納的散列數時，把散列空間劃分為若干區間，
+    每個區間掃描一遍文件，只合併落在該區間的散列，因此去重集合的大小與文件大小無關
+    """
+    if (block_size * 8) % 64 or block_size < 8:
+        raise ValueError(f"流式掃描要求分組大小為 8 的倍數: {block_size}")
+    chunk_bytes -= chunk_bytes % block_size
+    mapped = _map_file(path)
+    try:
+        total = len(mapped) // block_size
+        partitions = max(1, -(-total * 8 // max_hash_bytes))
+        unique = 0
+        for partition in range(partitions):
+            seen = np.empty(0, dtype=np.uint64)
+            for offset in range(0, len(mapped), chunk_bytes):
+                view = memoryview(mapped)[offset:offset + chunk_bytes]
+                blocks = block_view(view, block_size)
+                hashes = _hash_blocks(blocks)
+                # 釋放對 mmap 的引用，否則無法關閉
+                del blocks
+                view.release()
+                if partitions > 1:
+                    hashes = hashes[_hash_partition(hashes, partitions) == partition]
+                seen = np.union1d(seen, hashes)
+            unique += len(seen)
+        return _make_stats(0, total, unique)
+    finally:
+        if isinstance(mapped, mmap.mmap):
+            mapped.close()
+
+
+def iter_encoded_records(path, encoding: str = 'hex') -> Iterator[bytes]:
+    """逐行讀取 hex 或 base64 編碼的密文，無法解碼的行作為空記錄"""
+    decode = bytes.fromhex if encoding == 'hex' else base64.b64decode
+    with open(path, 'r', encoding='ascii', errors='replace') as file:
+        for line in file:
+            try:
+                yield decode(line.strip())
+            except (ValueError, binascii.Error):
+                yield b''
+
+
+def scan_encoded_records(path, encoding: str = 'hex', block_size: int = BLOCK_SIZE,
+                         batch_records: int = RECORD_BATCH_SIZE) -> Iterator[BlockStats]:
+    """分批對逐行編碼的密文評分"""
+    batch = []
+    first_record = 0
+    for record in iter_encoded_records(path, encoding):
+        batch.append(record)
+        if len(batch) >= batch_records:
+            yield from score_records(batch, block_size, first_record)
+            first_record += len(batch)
+            batch = []
+    if batch:
+        yield from score_records(batch, block_size, first_record)
+
+
+def scan_file(path, fmt: str = 'raw', block_size: int = BLOCK_SIZE,
+              record_size: Optional[int] = None) -> Iterator[BlockStats]:
+    """按輸入格式掃描文件，逐條產生 BlockStats"""
+    if fmt in ('hex', 'base64'):
+        return scan_encoded_records(path, fmt, block_size)
+    if record_size:
+        return scan_fixed_records(path, record_size, block_size)
+    return iter([scan_stream(path, block_size)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢測密文中的 ECB 分組重複")
+    parser.add_argument('path', help="密文文件")
+    parser.add_argument('--format', choices=('raw', 'hex', 'base64'), default='raw', help="輸入格式")
+    parser.add_argument('--record-size', type=int, help="raw 格式下每條記錄的字節數，默認整個文件為一條記錄")
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE, help="分組大小")
+    parser.add_argument('--threshold', type=float, default=0.0, help="只輸出重複佔比大於此值的記錄")
+    parser.add_argument('--jsonl', action='store_true', help="以 JSON Lines 輸出每條記錄的統計")
+    args = parser.parse_args(argv)
+
+    records = flagged = 0
+    for stats in scan_file(args.path, args.format, args.block_size, args.record_size):
+        records += 1
+        if stats.repeated_blocks and stats.score > args.threshold:
+            flagged += 1
+            if args.jsonl:
+                print(json.dumps(stats._asdict()))
+            else:
+                print(f"⚠️ 記錄 {stats.record}: {stats.repeated_blocks}/{stats.blocks} 個分組重複 "
+                      f"(佔比 {stats.score:.3f})")
+    if not args.jsonl:
+        print(f"📊 共掃描 {records} 條記錄，{flagged} 條疑似使用 ECB 模式")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
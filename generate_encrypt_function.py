@@ -1,9 +1,338 @@
 import re
 import os
+import io
 import ast
 import sys
-from typing import List, Dict, Optional, Set, Tuple
-from pathlib import Path
+import json
+import time
+import hashlib
+import argparse
+import zipfile
+import tokenize
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, List, Dict, NamedTuple, Optional, Set, Tuple, Union
+from pathlib import Path, PurePosixPath
+
+
+def compile_keyword_matcher(keywords: Iterable[str]) -> re.Pattern:
+    """將關鍵字集合編譯為單個交替正則，較長的關鍵字優先匹配"""
+    ordered = sorted(set(keywords), key=lambda keyword: (-len(keyword), keyword))
+    return re.compile('|'.join(re.escape(keyword) for keyword in ordered))
+
+
+def compile_token_word_matcher(keywords: Iterable[str], exact_words: Iterable[str] = (),
+                               prefix_min_length: int = 5) -> re.Pattern:
+    """編譯詞級匹配器（配合 fullmatch 使用）
+
+    短關鍵字須整詞匹配，可帶數字後綴（如 sha256、md5）；
+    長度不小於 prefix_min_length 的關鍵字可作為詞的前綴（如 encryption、ciphertext）
+    """
+    keywords = set(keywords)
+    exact = {kw for kw in keywords if len(kw) < prefix_min_length} | set(exact_words)
+    prefix = {kw for kw in keywords if len(kw) >= prefix_min_length}
+    return re.compile(
+        rf"(?:{compile_keyword_matcher(exact).pattern})\d*"
+        rf"|(?:{compile_keyword_matcher(prefix).pattern})\w*"
+    )
+
+
+class SourceSpan(NamedTuple):
+    """低內存模式下代替代碼片段保存的源碼行範圍（0 起始，含結束行）"""
+    path: Path
+    start: int
+    end: int
+
+
+class CryptoASTVisitor(ast.NodeVisitor):
+    """
+    單次遍歷 AST 的加密代碼收集器，同時收集 import、加密函數、類和模塊級常量
+    """
+
+    # 其子語句仍屬於模塊作用域的節點（頂層、if 和 try 分支）
+    MODULE_SCOPE_NODES = (ast.Module, ast.If, ast.Try, ast.ExceptHandler) + (
+        (ast.TryStar,) if hasattr(ast, 'TryStar') else ()
+    )
+
+    def __init__(self, extractor: 'EncryptionExtractor', content: str,
+                 file_path: Optional[Path] = None):
+        """初始化收集器
+
+        Args:
+            extractor: 提供判斷規則的加密提取器
+            content: 文件源代碼
+            file_path: 文件路徑，用於函數分類結果的緩存
+        """
+        self.extractor = extractor
+        self.content = content
+        self.file_path = file_path
+        self.lines = content.splitlines()
+        self.imports = []
+        # 所有 import 的模塊名，用於查找項目內部依賴
+        self.imported_modules = []
+        self.has_crypto = False
+        # 以 (深度, 先序編號, 代碼) 記錄，輸出時還原為 ast.walk 的廣度優先順序
+        self._functions = []
+        self._classes = []
+        self._constants = []
+        self._stack = []
+        # 與 _stack 對齊：對應節點的子語句是否仍在模塊作用域內
+        self._module_scopes = []
+        self._order = 0
+
+    def visit(self, node: ast.AST):
+        self._order += 1
+        in_module_scope = not self._module_scopes or self._module_scopes[-1]
+        self._stack.append(node)
+        self._module_scopes.append(in_module_scope and isinstance(node, self.MODULE_SCOPE_NODES))
+        try:
+            return super().visit(node)
+        finally:
+            self._stack.pop()
+            self._module_scopes.pop()
+
+    def _in_module_scope(self) -> bool:
+        """當前節點是否為模塊級語句"""
+        return len(self._module_scopes) > 1 and self._module_scopes[-2]
+
+    def _collect(self, bucket: list, node: ast.AST):
+        """記錄節點的源碼行範圍及其遍歷位置"""
+        span = self.extractor._node_span(node, self.lines)
+        if span:
+            bucket.append((len(self._stack), self._order, span))
+
+    def _accept_import(self, import_stmt: str, project_module: Optional[str] = None,
+                       accepted: bool = True):
+        """記錄候選 import 語句
+
+        是否屬於項目內部模塊與項目有關，留到合併時由 _resolve_imports 判斷，
+        以便文件結果可以跨項目緩存
+        """
+        self.imports.append([import_stmt, project_module, accepted])
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.imported_modules.append(alias.name.split('.')[0])
+            import_stmt = f"import {alias.name}"
+            if alias.asname:
+                import_stmt += f" as {alias.asname}"
+
+            # 檢查是否為加密相關或標準庫
+            if (self.extractor._is_crypto_library(alias.name) or
+                self.extractor._is_encryption_related(alias.name) or
+                alias.name in self.extractor.STANDARD_MODULES):
+                self._accept_import(import_stmt)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ""
+        level = "." * (node.level or 0)
+        if node.module:
+            self.imported_modules.append(node.module)
+
+        for alias in node.names:
+            import_stmt = f"from {level}{module} import {alias.name}"
+            if alias.asname:
+                import_stmt += f" as {alias.asname}"
+
+            # 檢查是否為加密相關、標準庫或項目內部
+            accepted = (self.extractor._is_crypto_library(module) or
+                        self.extractor._is_encryption_related(alias.name) or
+                        self.extractor._is_encryption_related(module) or
+                        module in self.extractor.STANDARD_MODULES)
+            if accepted or module:
+                self._accept_import(import_stmt, module, accepted)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        if self.extractor._is_crypto_function(node, self.file_path):
+            self.has_crypto = True
+            self._collect(self._functions, node)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        if (self.extractor._is_encryption_related(node.name) or
+            self.extractor._class_contains_crypto_methods(node, self.file_path)):
+            self.has_crypto = True
+            self._collect(self._classes, node)
+        self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        # 只處理模塊級別的賦值（頂層或嵌套在 if/try 中，不在類或函數內部）
+        if self._in_module_scope():
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    var_name = target.id
+                    if (var_name.isupper() and
+                        (self.extractor._is_encryption_related(var_name) or
+                         self.extractor._assignment_contains_crypto_values(node))):
+                        self._collect(self._constants, node)
+        self.generic_visit(node)
+
+    @staticmethod
+    def _in_walk_order(bucket: list) -> List[List[int]]:
+        return [span for _, _, span in sorted(bucket, key=lambda item: item[:2])]
+
+    def results(self) -> Dict:
+        """返回單個文件的提取結果，函數、類和常量以源碼行範圍表示"""
+        return {
+            'imports': self.imports,
+            'imported_modules': self.imported_modules,
+            'functions': self._in_walk_order(self._functions),
+            'classes': self._in_walk_order(self._classes),
+            'constants': self._in_walk_order(self._constants),
+            'has_crypto': self.has_crypto
+        }
+
+
+class ExtractionCache:
+    """
+    逐文件提取結果的磁盤緩存，按文件內容的 SHA-256 和提取規則版本索引
+    """
+
+    # 距上次淘汰新寫入的條目數達到此值，或距上次淘汰超過此時間（秒）時才重新淘汰
+    EVICT_EVERY_ENTRIES = 2000
+    EVICT_INTERVAL = 6 * 3600
+    STATE_FILE = '.evict_state.json'
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = 512 * 1024 * 1024,
+                 max_age_days: Optional[float] = 30):
+        """初始化緩存目錄
+
+        Args:
+            cache_dir: 緩存目錄
+            max_bytes: 緩存總大小上限，超出時淘汰最久未使用的條目
+            max_age_days: 條目最長保留天數
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(content: str, rules_version: str) -> str:
+        """由文件內容和規則版本計算緩存鍵"""
+        digest = hashlib.sha256()
+        digest.update(rules_version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """讀取緩存條目，未命中或條目損壞時返回 None"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            # 更新修改時間，淘汰時視為最近使用
+            os.utime(entry_path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, entry: Dict):
+        """寫入緩存條目（先寫臨時文件再替換，避免並行寫入時讀到半個文件）"""
+        entry_path = self._entry_path(key)
+        temp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.tmp")
+        try:
+            entry_path.parent.mkdir(exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(entry, file, ensure_ascii=False)
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            print(f"⚠️ 寫入緩存 {entry_path} 時發生錯誤: {e}")
+
+    def evict(self) -> int:
+        """刪除過期條目，再按最近使用時間淘汰到大小上限以內，返回刪除的條目數"""
+        now = time.time()
+        entries = []
+        removed = 0
+        for entry_path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            if self.max_age_days is not None and now - stat.st_mtime > self.max_age_days * 86400:
+                entry_path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+        
+        total_size = sum(size for _, size, _ in entries)
+        if self.max_bytes is not None and total_size > self.max_bytes:
+            for _, size, entry_path in sorted(entries):
+                if total_size <= self.max_bytes:
+                    break
+                entry_path.unlink(missing_ok=True)
+                total_size -= size
+                removed += 1
+        return removed
+
+    def maybe_evict(self, new_entries: int = 0) -> int:
+        """
+        累計新寫入的條目數，達到 EVICT_EVERY_ENTRIES 或距上次淘汰超過 EVICT_INTERVAL 時才執行 evict，
+        避免批處理中每個項目都遍歷整個緩存目錄；返回刪除的條目數
+        """
+        state_path = self.cache_dir / self.STATE_FILE
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            last_evict, pending = float(state['last_evict']), int(state['pending'])
+        except (OSError, ValueError, KeyError, TypeError):
+            # 沒有記錄時立即淘汰一次
+            last_evict, pending = 0.0, 0
+        pending += new_entries
+        now = time.time()
+        removed = 0
+        if pending >= self.EVICT_EVERY_ENTRIES or now - last_evict >= self.EVICT_INTERVAL:
+            removed = self.evict()
+            last_evict, pending = now, 0
+        try:
+            with open(state_path, 'w', encoding='utf-8') as file:
+                json.dump({'last_evict': last_evict, 'pending': pending}, file)
+        except OSError as e:
+            print(f"⚠️ 寫入緩存狀態 {state_path} 時發生錯誤: {e}")
+        return removed
+
+
+class DuplicateIndex:
+    """
+    跨項目的重複文件索引，按規範化內容索引逐文件提取結果，並記錄包含每個文件的項目
+
+    多個提取器共用同一個索引時，fork 和複製的文件只分析一次，結果分發給每個包含它的項目
+    """
+
+    # 只統一換行符和行尾空白，行號不變，因此按行範圍記錄的提取結果可直接復用
+    LINE_SPLITTER = re.compile(r'\r\n|\r|\n')
+
+    def __init__(self):
+        self.results = {}  # 規範化內容鍵 -> 逐文件提取結果
+        self.locations = defaultdict(set)  # 規範化內容鍵 -> {(項目名稱, 相對路徑)}
+
+    @classmethod
+    def make_key(cls, content: str, rules_version: str) -> str:
+        """由規範化後的文件內容和規則版本計算索引鍵"""
+        normalized = '\n'.join(line.rstrip(' \t') for line in cls.LINE_SPLITTER.split(content))
+        return ExtractionCache.make_key(normalized, rules_version)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.results.get(key)
+
+    def add(self, key: str, entry: Dict, project_name: str, relative_path: str):
+        """記錄文件出現的位置，首次出現時保存其提取結果"""
+        self.results.setdefault(key, entry)
+        self.locations[key].add((project_name, relative_path))
+
+    def duplicates(self) -> Dict[str, List[Tuple[str, str]]]:
+        """返回出現在多個位置的文件: 索引鍵 -> 排序後的 (項目名稱, 相對路徑) 列表"""
+        return {key: sorted(locations) for key, locations in self.locations.items()
+                if len(locations) > 1}
+
+    def projects_containing(self, key: str) -> List[str]:
+        """返回包含該文件的所有項目，用於把一個文件的發現分發給每個項目"""
+        return sorted({project for project, _ in self.locations.get(key, ())})
+
 
 class EncryptionExtractor:
     """
@@ -23,16 +352,89 @@ class EncryptionExtractor:
         'hashlib', 'hmac', 'secrets', 'base64'
     }
     
-    def __init__(self, project_path: str):
+    # 需要保留的常用標準庫
+    STANDARD_MODULES = {
+        'os', 'sys', 'struct', 'socket', 'threading', 'time', 'unittest', 'filecmp'
+    }
+    
+    # 函數源碼中的加密相關調用或操作
+    CRYPTO_PATTERNS = (
+        'aes.new', 'cipher.', '.encrypt', '.decrypt', '.digest', 
+        '.hexdigest', 'hash', 'crypto', 'pbkdf', 'hmac', 'rsa', 'key'
+    )
+    
+    # 類加載時預編譯的匹配器
+    KEYWORD_MATCHER = compile_keyword_matcher(ENCRYPTION_KEYWORDS)
+    LIBRARY_MATCHER = compile_keyword_matcher(CRYPTO_LIBRARIES)
+    LIBRARY_LOWER_MATCHER = compile_keyword_matcher(lib.lower() for lib in CRYPTO_LIBRARIES)
+    PATTERN_MATCHER = compile_keyword_matcher(CRYPTO_PATTERNS)
+    
+    # token 預篩選使用的詞級匹配器
+    TOKEN_WORD_MATCHER = compile_token_word_matcher(
+        ENCRYPTION_KEYWORDS,
+        {lib.lower() for lib in CRYPTO_LIBRARIES} | {'digest', 'hexdigest'}
+    )
+    # 按 snake_case、camelCase 和非字母數字字符拆分標識符
+    IDENTIFIER_SPLITTER = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+\d*|[A-Z]+\d*|\d+')
+    
+    PREFILTER_MODES = ('text', 'token')
+    
+    # 修改提取邏輯時遞增，使舊的緩存結果失效
+    RULES_VERSION = 2
+    
+    def __init__(self, project_path: Union[str, bytes, BinaryIO], prefilter: str = 'text', workers: int = 1,
+                 cache_dir: Optional[str] = None, cache_max_bytes: Optional[int] = 512 * 1024 * 1024,
+                 cache_max_age_days: Optional[float] = 30, low_memory: bool = False,
+                 project_name: Optional[str] = None, dedup_index: Optional[DuplicateIndex] = None):
         """初始化修復版本的加密提取器
 
         Args:
-            project_path: 項目根目錄路徑
+            project_path: 項目根目錄路徑，也可以是 ZIP 文件路徑、ZIP 內容（bytes）
+                或可讀的二進制文件對象，此時直接讀取壓縮包內的 .py 成員而不解壓
+            prefilter: 加密文件預篩選模式，'text' 為全文小寫子串匹配，
+                'token' 只按詞匹配 NAME 和 STRING token
+            workers: 並行解析和提取文件的進程數，1 為串行
+            cache_dir: 逐文件提取結果的緩存目錄，None 表示不使用緩存
+            cache_max_bytes: 緩存總大小上限
+            cache_max_age_days: 緩存條目最長保留天數
+            low_memory: 低內存模式，處理完文件後即釋放源碼和AST，
+                只保留代碼片段的行範圍，生成 Oracle 文件時再按需讀取
+            project_name: 項目名稱，默認取目錄名或 ZIP 文件名
+            dedup_index: 多個項目共用的重複文件索引，內容相同的文件只分析一次
         """
-        self.project_path = Path(project_path)
+        if prefilter not in self.PREFILTER_MODES:
+            raise ValueError(f"未知的預篩選模式: {prefilter}")
+        if workers < 1:
+            raise ValueError(f"進程數必須大於 0: {workers}")
+        # ZIP 來源：文件路徑、bytes 或二進制文件對象
+        self._zip_source = None
+        self._zip_file = None
+        if isinstance(project_path, (bytes, bytearray)) or hasattr(project_path, 'read'):
+            self._zip_source = project_path
+            self.project_path = Path(project_name or 'memory.zip')
+        else:
+            self.project_path = Path(project_path)
+            if self.project_path.is_file() and zipfile.is_zipfile(self.project_path):
+                self._zip_source = str(self.project_path)
+        # ZIP 內所有成員共同的頂層目錄（GitHub zipball 為 owner-repo-sha/）
+        self._zip_root = PurePosixPath()
+        self.project_name = project_name or (
+            self.project_path.stem if self.is_zip else self.project_path.name)
+        self.prefilter = prefilter
+        self.workers = workers
+        self.low_memory = low_memory
+        self.rules_version = self._compute_rules_version()
+        self.cache = (ExtractionCache(cache_dir, cache_max_bytes, cache_max_age_days)
+                      if cache_dir else None)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dedup_index = dedup_index
+        self.dedup_hits = 0
         self.all_python_files = []
         self.file_contents = {}
         self.file_asts = {}
+        self.file_results = {}  # 存儲每個文件的單次遍歷提取結果
+        self.parsed_files = set()  # 成功解析AST的文件
         self.project_modules = {}  # 存儲項目內部模塊的映射
         self.encryption_code = {
             'imports': set(),
@@ -42,25 +444,93 @@ class EncryptionExtractor:
             'helper_functions': []
         }
         self.analyzed_files = set()
+        # 函數分類緩存: (文件, 行號, 列號) -> 是否與加密相關，只在分析單個文件期間保留
+        self._function_crypto_cache = {}
+        self.classification_hits = 0
+        self.classification_misses = 0
+        # 各關鍵字的命中次數，用於評分
+        self.keyword_hits = Counter()
         
         # 掃描項目中的所有Python文件
         self._scan_python_files()
         # 建立項目模塊映射
         self._build_module_mapping()
+    
+    def __getstate__(self):
+        """傳給工作進程時只保留規則和模塊映射，不攜帶逐文件的數據和重複文件索引"""
+        state = self.__dict__.copy()
+        state.update(file_contents={}, file_asts={}, file_results={},
+                     parsed_files=set(), _function_crypto_cache={}, _zip_file=None, dedup_index=None)
+        return state
+    
+    @property
+    def is_zip(self) -> bool:
+        """是否直接從 ZIP 壓縮包讀取項目"""
+        return self._zip_source is not None
+    
+    def _open_zip(self) -> zipfile.ZipFile:
+        """打開 ZIP 來源（每個進程只打開一次）"""
+        if self._zip_file is None:
+            source = self._zip_source
+            if isinstance(source, (bytes, bytearray)):
+                source = io.BytesIO(source)
+            self._zip_file = zipfile.ZipFile(source)
+        return self._zip_file
+    
+    def _zip_source_as_bytes(self) -> Union[str, bytes]:
+        """將文件對象形式的 ZIP 來源讀為 bytes，供工作進程各自打開"""
+        source = self._zip_source
+        if hasattr(source, 'read'):
+            source.seek(0)
+            source = source.read()
+        return source
         
+    def _compute_rules_version(self) -> str:
+        """由規則版本號、預篩選模式和各關鍵字集合計算提取規則指紋"""
+        rules = {
+            'version': self.RULES_VERSION,
+            'prefilter': self.prefilter,
+            'keywords': sorted(self.ENCRYPTION_KEYWORDS),
+            'libraries': sorted(self.CRYPTO_LIBRARIES),
+            'standard_modules': sorted(self.STANDARD_MODULES),
+            'patterns': list(self.CRYPTO_PATTERNS)
+        }
+        return hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
     def _scan_python_files(self):
         """掃描項目中的所有Python文件"""
+        if self.is_zip:
+            self._scan_zip_members()
+            return
         for py_file in self.project_path.rglob("*.py"):
             if py_file.is_file() and not py_file.name.startswith('.'):
                 self.all_python_files.append(py_file)
+    
+    def _scan_zip_members(self):
+        """掃描 ZIP 中的所有 .py 成員，以成員路徑（PurePosixPath）作為文件標識"""
+        members = [info.filename for info in self._open_zip().infolist() if not info.is_dir()]
+        
+        top_levels = {PurePosixPath(name).parts[0] for name in members if '/' in name}
+        if len(top_levels) == 1 and all('/' in name for name in members):
+            self._zip_root = PurePosixPath(top_levels.pop())
+        
+        for name in members:
+            py_file = PurePosixPath(name)
+            if py_file.suffix == '.py' and not py_file.name.startswith('.'):
+                self.all_python_files.append(py_file)
                 
+    def _relative_path(self, py_file: Path) -> Path:
+        """文件相對於項目根目錄（或 ZIP 根目錄）的路徑"""
+        return py_file.relative_to(self._zip_root if self.is_zip else self.project_path)
+    
     def _build_module_mapping(self):
         """建立項目內部模塊的映射關係"""
         for py_file in self.all_python_files:
             # 計算相對於項目根目錄的模塊路徑
             try:
-                relative_path = py_file.relative_to(self.project_path)
-                module_name = str(relative_path.with_suffix('')).replace(os.sep, '.')
+                root = self._zip_root if self.is_zip else self.project_path
+                relative_path = py_file.relative_to(root)
+                module_name = '.'.join(relative_path.with_suffix('').parts)
                 
                 # 也記錄文件名（不含路徑）
                 file_name = py_file.stem
@@ -74,33 +544,54 @@ class EncryptionExtractor:
     
     def _read_file(self, file_path: Path) -> Tuple[str, Optional[ast.AST]]:
         """讀取文件內容並解析AST"""
+        content = self._read_text(file_path)
+        if content is None:
+            return "", None
+        return content, self._parse_content(content, file_path)
+    
+    def _read_text(self, file_path: Path) -> Optional[str]:
+        """讀取文件內容，失敗時返回 None"""
         try:
+            if self.is_zip:
+                return self._open_zip().read(str(file_path)).decode('utf-8')
             with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            try:
-                ast_tree = ast.parse(content)
-                return content, ast_tree
-            except SyntaxError as e:
-                print(f"⚠️ 警告: 無法解析 {file_path} 的AST: {e}")
-                return content, None
-                
+                return file.read()
         except Exception as e:
             print(f"❌ 讀取文件 {file_path} 時發生錯誤: {e}")
-            return "", None
+            return None
+    
+    def _parse_content(self, content: str, file_path: Path) -> Optional[ast.AST]:
+        """解析文件AST，語法錯誤時返回 None"""
+        try:
+            return ast.parse(content)
+        except SyntaxError as e:
+            print(f"⚠️ 警告: 無法解析 {file_path} 的AST: {e}")
+            return None
     
     def _is_encryption_related(self, name: str) -> bool:
         """判斷名稱是否與加密相關"""
         if not name:
             return False
-        name_lower = name.lower()
-        return any(keyword in name_lower for keyword in self.ENCRYPTION_KEYWORDS)
+        return self._match_keyword(self.KEYWORD_MATCHER, name.lower()) is not None
     
     def _is_crypto_library(self, module_name: str) -> bool:
         """判斷模塊是否為加密庫"""
         if not module_name:
             return False
-        return any(lib in module_name for lib in self.CRYPTO_LIBRARIES)
+        return self._match_keyword(self.LIBRARY_MATCHER, module_name) is not None
+    
+    def _match_keyword(self, matcher: re.Pattern, text: str) -> Optional[str]:
+        """返回文本中匹配到的第一個關鍵字，並記錄命中次數"""
+        match = matcher.search(text)
+        if match is None:
+            return None
+        keyword = match.group()
+        self.keyword_hits[keyword] += 1
+        return keyword
+    
+    def find_encryption_keywords(self, text: str) -> Counter:
+        """統計文本中出現的所有加密關鍵字（不區分大小寫）"""
+        return Counter(match.group() for match in self.KEYWORD_MATCHER.finditer(text.lower()))
     
     def _fix_import_statement(self, import_stmt: str) -> str:
         """修復導入語句，將項目內部導入轉換為正確的格式"""
@@ -129,52 +620,17 @@ class EncryptionExtractor:
         
         return import_stmt
     
-    def _extract_imports_from_ast(self, ast_tree: ast.AST, file_path: Path) -> List[str]:
-        """從AST中提取import語句"""
-        imports = []
-        
-        for node in ast.walk(ast_tree):
-            if isinstance(node, (ast.Import, ast.ImportFrom)):
-                try:
-                    if isinstance(node, ast.Import):
-                        for alias in node.names:
-                            import_stmt = f"import {alias.name}"
-                            if alias.asname:
-                                import_stmt += f" as {alias.asname}"
-                            
-                            # 檢查是否為加密相關或標準庫
-                            if (self._is_crypto_library(alias.name) or 
-                                self._is_encryption_related(alias.name) or
-                                alias.name in ['os', 'sys', 'struct', 'socket', 'threading', 'time', 'unittest', 'filecmp']):
-                                imports.append(self._fix_import_statement(import_stmt))
-                                
-                    elif isinstance(node, ast.ImportFrom):
-                        module = node.module or ""
-                        level = "." * (node.level or 0)
-                        
-                        for alias in node.names:
-                            import_stmt = f"from {level}{module} import {alias.name}"
-                            if alias.asname:
-                                import_stmt += f" as {alias.asname}"
-                            
-                            # 檢查是否為加密相關、標準庫或項目內部
-                            if (self._is_crypto_library(module) or 
-                                self._is_encryption_related(alias.name) or
-                                self._is_encryption_related(module) or
-                                module in ['os', 'sys', 'struct', 'socket', 'threading', 'time', 'unittest', 'filecmp'] or
-                                module in self.project_modules):
-                                imports.append(self._fix_import_statement(import_stmt))
-                                
-                except Exception as e:
-                    print(f"⚠️ 處理import語句時出錯: {e}")
-                    continue
-                    
-        return imports
+    def _resolve_imports(self, import_entries: List[list]) -> List[str]:
+        """按當前項目的模塊映射篩選並修復文件結果中的候選 import 語句"""
+        return [
+            self._fix_import_statement(import_stmt)
+            for import_stmt, project_module, accepted in import_entries
+            if accepted or project_module in self.project_modules
+        ]
     
-    def _extract_node_code(self, node: ast.AST, content: str, fix_indentation: bool = True) -> Optional[str]:
-        """從AST節點提取代碼，並修復縮進問題"""
+    def _node_span(self, node: ast.AST, lines: List[str]) -> Optional[List[int]]:
+        """計算AST節點的源碼行範圍 [起始行, 結束行]（0 起始，含結束行）"""
         try:
-            lines = content.splitlines()
             start_line = node.lineno - 1
             
             if hasattr(node, 'end_lineno') and node.end_lineno:
@@ -195,18 +651,31 @@ class EncryptionExtractor:
                                 break
                         end_line = i
             
-            extracted_code = '\n'.join(lines[start_line:end_line + 1])
-            
-            # 修復縮進問題
-            if fix_indentation:
-                extracted_code = self._fix_code_indentation(extracted_code)
-            
-            return extracted_code
+            return [start_line, end_line]
             
         except Exception as e:
             print(f"⚠️ 提取節點代碼時出錯: {e}")
             return None
     
+    def _span_code(self, lines: List[str], span: List[int], fix_indentation: bool = True) -> str:
+        """按行範圍提取代碼，並修復縮進問題"""
+        start_line, end_line = span
+        extracted_code = '\n'.join(lines[start_line:end_line + 1])
+        
+        # 修復縮進問題
+        if fix_indentation:
+            extracted_code = self._fix_code_indentation(extracted_code)
+        
+        return extracted_code
+    
+    def _extract_node_code(self, node: ast.AST, content: str, fix_indentation: bool = True) -> Optional[str]:
+        """從AST節點提取代碼，並修復縮進問題"""
+        lines = content.splitlines()
+        span = self._node_span(node, lines)
+        if span is None:
+            return None
+        return self._span_code(lines, span, fix_indentation)
+    
     def _fix_code_indentation(self, code: str) -> str:
         """修復代碼縮進問題"""
         lines = code.split('\n')
@@ -233,71 +702,6 @@ class EncryptionExtractor:
         
         return '\n'.join(fixed_lines)
     
-    def _extract_functions_from_ast(self, ast_tree: ast.AST, content: str) -> List[str]:
-        """從AST中提取函數定義"""
-        functions = []
-        
-        for node in ast.walk(ast_tree):
-            if isinstance(node, ast.FunctionDef):
-                # 檢查函數名是否與加密相關
-                if (self._is_encryption_related(node.name) or 
-                    self._function_contains_crypto_operations(node)):
-                    # 提取函數代碼
-                    function_code = self._extract_node_code(node, content)
-                    if function_code:
-                        functions.append(function_code)
-                        
-        return functions
-    
-    def _extract_classes_from_ast(self, ast_tree: ast.AST, content: str) -> List[str]:
-        """從AST中提取類定義"""
-        classes = []
-        
-        for node in ast.walk(ast_tree):
-            if isinstance(node, ast.ClassDef):
-                # 檢查類名是否與加密相關或包含加密方法
-                if (self._is_encryption_related(node.name) or 
-                    self._class_contains_crypto_methods(node)):
-                    class_code = self._extract_node_code(node, content)
-                    if class_code:
-                        classes.append(class_code)
-                        
-        return classes
-    
-    def _extract_constants_from_ast(self, ast_tree: ast.AST, content: str) -> List[str]:
-        """從AST中提取常量定義（只提取模塊級別的常量）"""
-        constants = []
-        
-        for node in ast.walk(ast_tree):
-            if isinstance(node, ast.Assign):
-                # 檢查是否為模塊級別的賦值（不在類或函數內部）
-                parent_nodes = []
-                for parent in ast.walk(ast_tree):
-                    for child in ast.iter_child_nodes(parent):
-                        if child is node:
-                            parent_nodes.append(parent)
-                
-                # 只處理模塊級別的賦值
-                is_module_level = True
-                for parent in parent_nodes:
-                    if isinstance(parent, (ast.FunctionDef, ast.ClassDef)):
-                        is_module_level = False
-                        break
-                
-                if is_module_level:
-                    # 檢查賦值語句是否為常量定義
-                    for target in node.targets:
-                        if isinstance(target, ast.Name):
-                            var_name = target.id
-                            if (var_name.isupper() and 
-                                (self._is_encryption_related(var_name) or 
-                                 self._assignment_contains_crypto_values(node))):
-                                constant_code = self._extract_node_code(node, content)
-                                if constant_code:
-                                    constants.append(constant_code)
-                                    
-        return constants
-    
     def _function_contains_crypto_operations(self, func_node: ast.FunctionDef) -> bool:
         """檢查函數是否包含加密操作"""
         try:
@@ -314,22 +718,31 @@ class EncryptionExtractor:
         except:
             func_source = func_node.name
         
-        func_source_lower = func_source.lower()
-        
         # 檢查是否包含加密相關的調用或操作
-        crypto_patterns = [
-            'aes.new', 'cipher.', '.encrypt', '.decrypt', '.digest', 
-            '.hexdigest', 'hash', 'crypto', 'pbkdf', 'hmac', 'rsa', 'key'
-        ]
+        return self._match_keyword(self.PATTERN_MATCHER, func_source.lower()) is not None
+    
+    def _is_crypto_function(self, func_node: ast.FunctionDef, file_path: Optional[Path] = None) -> bool:
+        """判斷函數是否與加密相關，同一文件中的函數節點只分類一次"""
+        cache_key = None
+        if file_path is not None:
+            cache_key = (str(file_path), func_node.lineno, func_node.col_offset)
+            cached = self._function_crypto_cache.get(cache_key)
+            if cached is not None:
+                self.classification_hits += 1
+                return cached
         
-        return any(pattern in func_source_lower for pattern in crypto_patterns)
+        self.classification_misses += 1
+        result = (self._is_encryption_related(func_node.name) or 
+                  self._function_contains_crypto_operations(func_node))
+        if cache_key is not None:
+            self._function_crypto_cache[cache_key] = result
+        return result
     
-    def _class_contains_crypto_methods(self, class_node: ast.ClassDef) -> bool:
+    def _class_contains_crypto_methods(self, class_node: ast.ClassDef, file_path: Optional[Path] = None) -> bool:
         """檢查類是否包含加密相關方法"""
         for node in ast.walk(class_node):
             if isinstance(node, ast.FunctionDef):
-                if (self._is_encryption_related(node.name) or 
-                    self._function_contains_crypto_operations(node)):
+                if self._is_crypto_function(node, file_path):
                     return True
         return False
     
@@ -338,86 +751,253 @@ class EncryptionExtractor:
         try:
             if hasattr(ast, 'unparse'):
                 assign_source = ast.unparse(assign_node).lower()
-                return any(keyword in assign_source for keyword in self.ENCRYPTION_KEYWORDS)
+                return self._match_keyword(self.KEYWORD_MATCHER, assign_source) is not None
         except:
             pass
         return False
     
-    def _file_contains_crypto(self, content: str, ast_tree: ast.AST) -> bool:
+    def _file_contains_crypto(self, content: str, file_result: Dict) -> bool:
         """檢查文件是否包含加密相關內容"""
         content_lower = content.lower()
         
         # 檢查關鍵字
-        if any(keyword in content_lower for keyword in self.ENCRYPTION_KEYWORDS):
+        if self._match_keyword(self.KEYWORD_MATCHER, content_lower):
             return True
             
         # 檢查加密庫導入
-        if any(lib.lower() in content_lower for lib in self.CRYPTO_LIBRARIES):
+        if self._match_keyword(self.LIBRARY_LOWER_MATCHER, content_lower):
             return True
             
-        # 檢查AST中的加密相關節點
-        if ast_tree:
-            for node in ast.walk(ast_tree):
-                if isinstance(node, ast.FunctionDef):
-                    if (self._is_encryption_related(node.name) or 
-                        self._function_contains_crypto_operations(node)):
-                        return True
-                elif isinstance(node, ast.ClassDef):
-                    if (self._is_encryption_related(node.name) or 
-                        self._class_contains_crypto_methods(node)):
+        # 檢查AST中的加密相關節點（由單次遍歷的結果給出）
+        return file_result['has_crypto']
+    
+    def _tokens_contain_crypto(self, content: str) -> bool:
+        """按 NAME 和 STRING token 的拆分詞檢查文件是否包含加密相關內容"""
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(content).readline):
+                if token.type not in (tokenize.NAME, tokenize.STRING):
+                    continue
+                for word in self.IDENTIFIER_SPLITTER.findall(token.string):
+                    word_lower = word.lower()
+                    if self.TOKEN_WORD_MATCHER.fullmatch(word_lower):
+                        self.keyword_hits[word_lower] += 1
                         return True
-                        
+        except (tokenize.TokenError, SyntaxError):
+            # 無法分詞時退回全文匹配
+            return self._match_keyword(self.KEYWORD_MATCHER, content.lower()) is not None
         return False
     
+    def _get_file_result(self, file_path: Path) -> Optional[Dict]:
+        """返回文件的提取結果，未分析過的文件在此時分析"""
+        if file_path not in self.file_results:
+            if file_path not in self.parsed_files:
+                return None
+            content = self.file_contents.get(file_path)
+            if content is None:
+                # 低內存模式下不保留源碼，需要時重新讀取
+                content = self._read_text(file_path) or ""
+            ast_tree = self.file_asts.get(file_path)
+            if ast_tree is None:
+                # 並行或低內存模式下不保留AST，僅在需要時重新解析
+                ast_tree = ast.parse(content)
+            self.file_results[file_path] = self._analyze_file(content, ast_tree, file_path)
+        return self.file_results[file_path]
+    
+    @staticmethod
+    def _new_record(py_file: Path, content: Optional[str]) -> Dict:
+        """尚未分析的文件記錄"""
+        return {
+            'path': py_file,
+            'content': content or "",
+            'ast': None,
+            'parsed': False,
+            'is_crypto': False,
+            'result': None,
+            'dedup_key': None
+        }
+    
+    def _process_file(self, py_file: Path) -> Dict:
+        """讀取、解析並分類單個文件，返回文件記錄"""
+        content = self._read_text(py_file)
+        record = self._new_record(py_file, content)
+        if content is None:
+            return record
+        
+        # 其他項目中已分析過的相同文件直接復用其結果
+        if self.dedup_index is not None and self._reuse_duplicate(record):
+            return record
+        
+        # 內容未變的文件直接使用緩存結果，不再解析
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ExtractionCache.make_key(content, self.rules_version)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                record.update(cached)
+                return record
+            self.cache_misses += 1
+        
+        ast_tree = self._parse_content(content, py_file)
+        record['ast'] = ast_tree
+        record['parsed'] = ast_tree is not None
+        if ast_tree:
+            # 檢查是否包含加密相關內容（token 模式下未通過預篩選的文件不做提取）
+            if self.prefilter == 'token':
+                record['is_crypto'] = self._tokens_contain_crypto(content)
+                if record['is_crypto']:
+                    record['result'] = self._analyze_file(content, ast_tree, py_file)
+            else:
+                record['result'] = self._analyze_file(content, ast_tree, py_file)
+                record['is_crypto'] = self._file_contains_crypto(content, record['result'])
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, {
+                'parsed': record['parsed'],
+                'is_crypto': record['is_crypto'],
+                'result': record['result']
+            })
+        return record
+    
+    def _reuse_duplicate(self, record: Dict) -> bool:
+        """計算記錄的重複文件索引鍵；已分析過相同文件時填入其結果並返回 True"""
+        record['dedup_key'] = DuplicateIndex.make_key(record['content'], self.rules_version)
+        shared = self.dedup_index.get(record['dedup_key'])
+        if shared is None:
+            return False
+        self.dedup_hits += 1
+        record.update(shared)
+        return True
+    
+    def _process_files_in_parallel(self) -> List[Dict]:
+        """在進程池中處理所有文件，按文件掃描順序返回記錄"""
+        # 重複文件索引只保存在主進程: 派發前先查找重複文件，只把未分析過的文件交給工作進程
+        records = {}
+        dedup_keys = {}
+        pending = []
+        for py_file in self.all_python_files:
+            content = self._read_text(py_file) if self.dedup_index is not None else None
+            if content is None:
+                pending.append(py_file)
+                continue
+            record = self._new_record(py_file, content)
+            if self._reuse_duplicate(record):
+                records[py_file] = record
+            else:
+                dedup_keys[py_file] = record['dedup_key']
+                pending.append(py_file)
+        
+        if pending:
+            chunksize = max(1, len(pending) // (self.workers * 4))
+            if self.is_zip:
+                # 文件對象的讀取位置會在進程間共享，改為讓每個工作進程各自打開 bytes
+                self._zip_source = self._zip_source_as_bytes()
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=_init_worker, initargs=(self,)) as executor:
+                for record in executor.map(_process_file_in_worker, pending, chunksize=chunksize):
+                    record['dedup_key'] = dedup_keys.get(record['path'])
+                    records[record['path']] = record
+        
+        # 合併工作進程中的統計信息
+        for record in records.values():
+            stats = record.pop('stats', None)
+            if stats is None:
+                continue
+            self.classification_hits += stats['classification_hits']
+            self.classification_misses += stats['classification_misses']
+            self.cache_hits += stats['cache_hits']
+            self.cache_misses += stats['cache_misses']
+            self.keyword_hits.update(stats['keyword_hits'])
+        return [records[py_file] for py_file in self.all_python_files]
+    
+    def _resolve_snippets(self, file_path: Path, spans: List[List[int]],
+                          lines: Optional[List[str]]) -> List[Union[str, SourceSpan]]:
+        """將文件結果中的行範圍轉換為代碼片段，低內存模式下保留為 SourceSpan"""
+        if self.low_memory:
+            return [SourceSpan(file_path, start, end) for start, end in spans]
+        return [self._span_code(lines, span) for span in spans]
+    
+    def _materialize_snippets(self, entries: List[Union[str, SourceSpan]],
+                              lines_cache: Dict[Path, List[str]]) -> List[str]:
+        """按需讀取 SourceSpan 對應的源碼行，每個文件只讀取一次"""
+        snippets = []
+        for entry in entries:
+            if isinstance(entry, SourceSpan):
+                if entry.path not in lines_cache:
+                    lines_cache[entry.path] = (self._read_text(entry.path) or "").splitlines()
+                entry = self._span_code(lines_cache[entry.path], [entry.start, entry.end])
+            snippets.append(entry)
+        return snippets
+    
+    def _analyze_file(self, content: str, ast_tree: ast.AST, file_path: Optional[Path] = None) -> Dict:
+        """以單次AST遍歷提取文件中的加密相關代碼"""
+        visitor = CryptoASTVisitor(self, content, file_path)
+        try:
+            visitor.visit(ast_tree)
+            return visitor.results()
+        finally:
+            # 分類結果只在同一文件內復用，文件分析完畢後即釋放
+            self._function_crypto_cache.clear()
+    
     def _extract_project_dependencies(self, crypto_files: List[Path]) -> Set[Path]:
-        """提取項目內部依賴文件"""
+        """提取項目內部依賴文件（使用已解析文件的 import 記錄，不重新讀取）"""
         dependencies = set()
         
         for crypto_file in crypto_files:
-            content, ast_tree = self._read_file(crypto_file)
-            if not ast_tree:
+            file_result = self._get_file_result(crypto_file)
+            if not file_result:
                 continue
                 
-            for node in ast.walk(ast_tree):
-                if isinstance(node, ast.ImportFrom) and node.module:
-                    module_name = node.module
-                    
-                    # 檢查是否為項目內部模塊
-                    if module_name in self.project_modules:
-                        dep_file = self.project_modules[module_name]
-                        if dep_file not in crypto_files:
-                            dependencies.add(dep_file)
-                            print(f"🔗 找到依賴: {module_name} -> {dep_file}")
-                
-                elif isinstance(node, ast.Import):
-                    for alias in node.names:
-                        module_name = alias.name.split('.')[0]
-                        if module_name in self.project_modules:
-                            dep_file = self.project_modules[module_name]
-                            if dep_file not in crypto_files:
-                                dependencies.add(dep_file)
-                                print(f"🔗 找到依賴: {module_name} -> {dep_file}")
+            for module_name in file_result['imported_modules']:
+                # 檢查是否為項目內部模塊
+                if module_name in self.project_modules:
+                    dep_file = self.project_modules[module_name]
+                    if dep_file not in crypto_files and dep_file not in dependencies:
+                        dependencies.add(dep_file)
+                        print(f"🔗 找到依賴: {module_name} -> {dep_file}")
         
         return dependencies
     
     def analyze_project(self):
         """分析整個項目的加密代碼"""
-        print(f"🔍 正在分析項目: {self.project_path.name}")
+        print(f"🔍 正在分析項目: {self.project_name}")
         print(f"📁 找到 {len(self.all_python_files)} 個Python文件")
         
         # 首先找到所有包含加密相關代碼的文件
         crypto_files = []
         
-        for py_file in self.all_python_files:
-            content, ast_tree = self._read_file(py_file)
-            self.file_contents[py_file] = content
-            self.file_asts[py_file] = ast_tree
+        if self.workers > 1:
+            records = self._process_files_in_parallel()
+        else:
+            records = map(self._process_file, self.all_python_files)
+        
+        for record in records:
+            py_file = record['path']
+            if record['dedup_key'] is not None:
+                self.dedup_index.add(record['dedup_key'], {
+                    'parsed': record['parsed'],
+                    'is_crypto': record['is_crypto'],
+                    'result': record['result']
+                }, self.project_name, self._relative_path(py_file).as_posix())
+            # 低內存模式下只保留緊湊的文件結果，源碼和AST隨記錄一起釋放
+            if not self.low_memory:
+                self.file_contents[py_file] = record['content']
+                if record['ast'] is not None:
+                    self.file_asts[py_file] = record['ast']
+            if record['parsed']:
+                self.parsed_files.add(py_file)
+            if record['result'] is not None:
+                self.file_results[py_file] = record['result']
             
-            if ast_tree:
-                # 檢查是否包含加密相關內容
-                if self._file_contains_crypto(content, ast_tree):
-                    crypto_files.append(py_file)
-                    print(f"✅ 發現加密相關文件: {py_file.name}")
+            if record['is_crypto']:
+                crypto_files.append(py_file)
+                print(f"✅ 發現加密相關文件: {py_file.name}")
+        
+        if self.cache is not None:
+            print(f"💾 緩存命中 {self.cache_hits} 個文件，重新解析 {self.cache_misses} 個文件")
+            self.cache.maybe_evict(self.cache_misses)
+        if self.dedup_index is not None:
+            print(f"♻️ {self.dedup_hits} 個文件與已分析的項目重複，直接復用結果")
         
         if not crypto_files:
             print("❌ 未發現包含加密相關代碼的文件")
@@ -425,24 +1005,23 @@ class EncryptionExtractor:
         
         # 查找項目內部依賴
         dependencies = self._extract_project_dependencies(crypto_files)
-        all_files_to_analyze = crypto_files + list(dependencies)
+        all_files_to_analyze = crypto_files + sorted(dependencies)
         
         # 分析所有相關文件
         for file_path in all_files_to_analyze:
             print(f"🔎 分析文件: {file_path.name}")
             
-            content = self.file_contents[file_path]
-            ast_tree = self.file_asts[file_path]
+            file_result = self._get_file_result(file_path)
             
-            if ast_tree:
+            if file_result:
                 # 提取imports
-                imports = self._extract_imports_from_ast(ast_tree, file_path)
-                self.encryption_code['imports'].update(imports)
+                self.encryption_code['imports'].update(self._resolve_imports(file_result['imports']))
                 
                 # 提取函數、類和常量
-                functions = self._extract_functions_from_ast(ast_tree, content)
-                classes = self._extract_classes_from_ast(ast_tree, content)
-                constants = self._extract_constants_from_ast(ast_tree, content)
+                lines = None if self.low_memory else self.file_contents[file_path].splitlines()
+                functions = self._resolve_snippets(file_path, file_result['functions'], lines)
+                classes = self._resolve_snippets(file_path, file_result['classes'], lines)
+                constants = self._resolve_snippets(file_path, file_result['constants'], lines)
                 
                 # 如果是依賴文件，將其函數標記為輔助函數
                 if file_path in dependencies:
@@ -462,11 +1041,13 @@ class EncryptionExtractor:
         os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
         
         output_content = []
+        # 低內存模式下代碼片段在此時按需讀取
+        lines_cache = {}
         
         # 文件頭
         output_content.append('#!/usr/bin/env python3')
         output_content.append('"""')
-        output_content.append(f"從 {self.project_path.name} 提取的加密 Oracle（修復版本）")
+        output_content.append(f"從 {self.project_name} 提取的加密 Oracle（修復版本）")
         output_content.append("此文件解決了導入依賴和代碼格式問題")
         output_content.append('"""')
         output_content.append("")
@@ -499,7 +1080,7 @@ class EncryptionExtractor:
         if self.encryption_code['constants']:
             output_content.append("# 常量定義")
             output_content.append("# " + "=" * 50)
-            for constant in self.encryption_code['constants']:
+            for constant in self._materialize_snippets(self.encryption_code['constants'], lines_cache):
                 output_content.append(constant)
                 output_content.append("")
         
@@ -507,7 +1088,7 @@ class EncryptionExtractor:
         if self.encryption_code['helper_functions']:
             output_content.append("# 輔助函數（來自項目依賴）")
             output_content.append("# " + "=" * 50)
-            for func in self.encryption_code['helper_functions']:
+            for func in self._materialize_snippets(self.encryption_code['helper_functions'], lines_cache):
                 output_content.append(func)
                 output_content.append("")
         
@@ -515,7 +1096,7 @@ class EncryptionExtractor:
         if self.encryption_code['classes']:
             output_content.append("# 主要類定義")
             output_content.append("# " + "=" * 50)
-            for cls in self.encryption_code['classes']:
+            for cls in self._materialize_snippets(self.encryption_code['classes'], lines_cache):
                 output_content.append(cls)
                 output_content.append("")
         
@@ -523,7 +1104,7 @@ class EncryptionExtractor:
         if self.encryption_code['functions']:
             output_content.append("# 主要函數定義")
             output_content.append("# " + "=" * 50)
-            for func in self.encryption_code['functions']:
+            for func in self._materialize_snippets(self.encryption_code['functions'], lines_cache):
                 output_content.append(func)
                 output_content.append("")
         
@@ -549,8 +1130,6 @@ class EncryptionExtractor:
         output_content.append("        print(f'⚠️ 測試過程中出現錯誤: {e}')")
         
         # 寫入文件
-        # print('output_path: ', output_path)
-        output_path = 'C:\\Users\\user\\Desktop\\台大密碼學\\專題\\ecb_encrypt.py'
         with open(output_path, 'w', encoding='utf-8') as file:
             file.write('\n'.join(output_content))
         
@@ -566,30 +1145,91 @@ class EncryptionExtractor:
         
         return output_path
 
-def main():
+_WORKER_EXTRACTOR = None
+
+
+def _init_worker(extractor: EncryptionExtractor):
+    """工作進程初始化：保存提取器副本"""
+    global _WORKER_EXTRACTOR
+    # fork 啟動時提取器未經序列化，不能沿用父進程已打開的 ZIP 句柄，也不使用主進程的重複文件索引
+    extractor._zip_file = None
+    extractor.dedup_index = None
+    _WORKER_EXTRACTOR = extractor
+
+
+def _process_file_in_worker(py_file: Path) -> Dict:
+    """在工作進程中處理單個文件，返回不含AST的可序列化記錄"""
+    extractor = _WORKER_EXTRACTOR
+    extractor.classification_hits = 0
+    extractor.classification_misses = 0
+    extractor.cache_hits = 0
+    extractor.cache_misses = 0
+    extractor.keyword_hits = Counter()
+    
+    record = extractor._process_file(py_file)
+    record['ast'] = None
+    if extractor.low_memory:
+        record['content'] = None
+    record['stats'] = {
+        'classification_hits': extractor.classification_hits,
+        'classification_misses': extractor.classification_misses,
+        'cache_hits': extractor.cache_hits,
+        'cache_misses': extractor.cache_misses,
+        'keyword_hits': extractor.keyword_hits
+    }
+    return record
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行參數"""
+    parser = argparse.ArgumentParser(description="修復版本的加密代碼提取器")
+    parser.add_argument('project_path', nargs='?', help="項目目錄或 ZIP 文件路徑（未提供時交互輸入）")
+    parser.add_argument('-o', '--output', help="輸出文件路徑")
+    parser.add_argument('--prefilter', choices=EncryptionExtractor.PREFILTER_MODES, default='text',
+                        help="加密文件預篩選模式")
+    parser.add_argument('--workers', type=int, default=1, help="並行分析的進程數")
+    parser.add_argument('--cache-dir', help="提取結果緩存目錄，指定後才啟用緩存")
+    parser.add_argument('--no-cache', action='store_true', help="不讀寫提取結果緩存（覆蓋 --cache-dir）")
+    parser.add_argument('--low-memory', action='store_true', help="不保留源碼和AST，生成時按需讀取代碼片段")
+    parser.add_argument('--cache-max-mb', type=int, default=512, help="緩存大小上限（MB）")
+    parser.add_argument('--cache-max-age-days', type=float, default=30, help="緩存條目最長保留天數")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """主程式"""
+    args = parse_args(argv)
     print("修復版本的加密代碼提取器")
     print("=" * 50)
     
     # 獲取項目路徑
-    project_path = input("請輸入項目目錄路徑: ").strip()
+    project_path = args.project_path or input("請輸入項目目錄或 ZIP 文件路徑: ").strip()
     
-    # 檢查目錄是否存在
-    if not os.path.isdir(project_path):
-        print(f"❌ 錯誤: 目錄 '{project_path}' 不存在")
+    # 檢查目錄或壓縮包是否存在
+    if not (os.path.isdir(project_path) or zipfile.is_zipfile(project_path)):
+        print(f"❌ 錯誤: 目錄或 ZIP 文件 '{project_path}' 不存在")
         return
     
     # 設定輸出文件路徑
-    project_name = os.path.basename(project_path.rstrip('/\\'))
     default_output = f"ecb_encrypt.py"
-    output_file = input(f"請輸入輸出文件路徑 [預設: {default_output}]: ").strip()
+    output_file = args.output
+    if not output_file and not args.project_path:
+        output_file = input(f"請輸入輸出文件路徑 [預設: {default_output}]: ").strip()
     if not output_file:
         output_file = default_output
     
     try:
         # 創建提取器並分析項目
         print(f"\n🔍 開始分析項目...")
-        extractor = EncryptionExtractor(project_path)
+        extractor = EncryptionExtractor(
+            project_path,
+            prefilter=args.prefilter,
+            workers=args.workers,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+            cache_max_age_days=args.cache_max_age_days,
+            low_memory=args.low_memory
+        )
         
         if extractor.analyze_project():
             # 生成修復後的 Oracle 文件
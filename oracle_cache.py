@@ -0,0 +1,202 @@
+"""
+利用 ECB 確定性的 Oracle 響應緩存
+
+同一密鑰下 ECB 對相同的明文總是產生相同的密文，因此:
+- 整個明文的響應可以按明文摘要緩存（有界 LRU）
+- 已知分組大小和前綴長度時，密文可以拆成三部分分別緩存:
+    頭部: 前綴 + 補齊前綴的輸入字節 -> 前面若干個密文分組
+    中間: 輸入中每個對齊的完整分組 -> 對應的一個密文分組
+    尾部: 輸入最後不足一個分組的字節 + 秘密 + 填充 -> 其餘的密文分組
+  新明文的各部分都已知時直接拼出密文；只缺部分中間分組時，只把缺少的分組發送給 Oracle
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+
+class LRUCache:
+    """有界的最近最少使用緩存"""
+
+    def __init__(self, max_entries: Optional[int] = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class OracleCache:
+    """
+    帶響應緩存和分組緩存的 Oracle 包裝，本身也可以作為加密函數使用
+
+    用法:
+        oracle = OracleCache(client)
+        oracle.configure(block_size=16, prefix_length=0)  # 可選，啟用分組緩存
+        oracle(b"...")
+    """
+
+    def __init__(self, oracle, max_responses: Optional[int] = 4096, max_blocks: Optional[int] = 1 << 20):
+        """
+        參數:
+            oracle: 接受明文 bytes、返回密文 bytes 的函數，支持 encrypt_batch 時批量查詢
+            max_responses: 緩存的完整響應數上限
+            max_blocks: 緩存的明文分組數上限（頭部和尾部共用此上限）
+        """
+        self.oracle = oracle
+        self.responses = LRUCache(max_responses)
+        self.blocks = LRUCache(max_blocks)
+        self.edges = LRUCache(max_blocks)
+        self.block_size = None
+        self.prefix_length = None
+        self.hits = 0          # 整個響應命中
+        self.assembled = 0     # 由分組緩存拼出的響應
+        self.block_hits = 0    # 不必重新加密的中間分組數
+        self.misses = 0        # 發送給 Oracle 的明文數
+
+    def configure(self, block_size: int, prefix_length: int = 0):
+        """設置分組大小和前綴長度，啟用分組級緩存"""
+        self.block_size = block_size
+        self.prefix_length = prefix_length
+
+    @staticmethod
+    def _digest(plaintext):
+        return hashlib.sha256(plaintext).digest()
+
+    def _split(self, plaintext):
+        """
+        把明文拆成 (頭部輸入字節, 中間分組列表, 尾部輸入字節, 頭部密文分組數)
+
+        輸入短於補齊前綴所需的字節時返回 None
+        """
+        size = self.block_size
+        alignment = (-self.prefix_length) % size
+        if len(plaintext) < alignment:
+            return None
+        body_length = (len(plaintext) - alignment) // size * size
+        middle = [plaintext[i:i + size] for i in range(alignment, alignment + body_length, size)]
+        head_blocks = (self.prefix_length + alignment) // size
+        return plaintext[:alignment], middle, plaintext[alignment + body_length:], head_blocks
+
+    def _learn(self, plaintext, ciphertext):
+        """從一個響應中記錄頭部、中間分組和尾部的密文"""
+        self.responses.put(self._digest(plaintext), ciphertext)
+        if self.block_size is None:
+            return
+        parts = self._split(plaintext)
+        if parts is None:
+            return
+        head, middle, tail, head_blocks = parts
+        size = self.block_size
+        self.edges.put(('head', head), ciphertext[:head_blocks * size])
+        for index, block in enumerate(middle, head_blocks):
+            self.blocks.put(block, ciphertext[index * size:(index + 1) * size])
+        self.edges.put(('tail', tail), ciphertext[(head_blocks + len(middle)) * size:])
+
+    def _assemble(self, plaintext, count=True):
+        """
+        嘗試由緩存拼出密文
+
+        返回:
+            tuple: (密文或 None, 需要發送給 Oracle 的縮減明文或 None)
+        """
+        if self.block_size is None:
+            return None, plaintext
+        parts = self._split(plaintext)
+        if parts is None:
+            return None, plaintext
+        head, middle, tail, _ = parts
+        head_cipher = self.edges.get(('head', head))
+        tail_cipher = self.edges.get(('tail', tail))
+        cached = [self.blocks.get(block) for block in middle]
+        missing = [block for block, cipher in zip(middle, cached) if cipher is None]
+        if head_cipher is not None and tail_cipher is not None and not missing:
+            if count:
+                self.block_hits += len(middle)
+            return head_cipher + b''.join(cached) + tail_cipher, None
+        unique_missing = list(dict.fromkeys(missing))
+        if len(unique_missing) < len(middle):
+            # 只發送缺少的（去重後的）中間分組，頭部和尾部照常附帶
+            self.block_hits += len(middle) - len(unique_missing)
+            return None, head + b''.join(unique_missing) + tail
+        return None, plaintext
+
+    def _lookup(self, plaintext):
+        """從緩存回答，返回 (密文或 None, 需要查詢的明文)"""
+        ciphertext = self.responses.get(self._digest(plaintext))
+        if ciphertext is not None:
+            self.hits += 1
+            return ciphertext, None
+        ciphertext, query = self._assemble(plaintext)
+        if ciphertext is not None:
+            self.assembled += 1
+            self.responses.put(self._digest(plaintext), ciphertext)
+        return ciphertext, query
+
+    def _finish(self, plaintext, query, response):
+        self._learn(query, response)
+        if query == plaintext:
+            return response
+        # 縮減查詢已補全了分組緩存；分組在此期間被淘汰時退回到查詢完整明文
+        ciphertext, _ = self._assemble(plaintext, count=False)
+        if ciphertext is None:
+            self.misses += 1
+            ciphertext = self.oracle(plaintext)
+            self._learn(plaintext, ciphertext)
+        self.responses.put(self._digest(plaintext), ciphertext)
+        return ciphertext
+
+    def __call__(self, plaintext: bytes) -> bytes:
+        plaintext = bytes(plaintext)
+        ciphertext, query = self._lookup(plaintext)
+        if ciphertext is not None:
+            return ciphertext
+        self.misses += 1
+        return self._finish(plaintext, query, self.oracle(query))
+
+    def encrypt_batch(self, plaintexts):
+        """批量加密，只把緩存無法回答的明文（或其縮減形式）發送給 Oracle"""
+        plaintexts = [bytes(plaintext) for plaintext in plaintexts]
+        results = [None] * len(plaintexts)
+        pending = {}  # 查詢明文 -> [(位置, 原明文)]
+        for position, plaintext in enumerate(plaintexts):
+            ciphertext, query = self._lookup(plaintext)
+            if ciphertext is not None:
+                results[position] = ciphertext
+            else:
+                pending.setdefault(query, []).append((position, plaintext))
+        if pending:
+            queries = list(pending)
+            self.misses += len(queries)
+            encrypt_batch = getattr(self.oracle, 'encrypt_batch', None)
+            responses = (encrypt_batch(queries) if encrypt_batch is not None
+                         else [self.oracle(query) for query in queries])
+            for query, response in zip(queries, responses):
+                for position, plaintext in pending[query]:
+                    results[position] = self._finish(plaintext, query, response)
+        return results
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'assembled': self.assembled,
+            'block_hits': self.block_hits,
+            'misses': self.misses,
+            'cached_responses': len(self.responses),
+            'cached_blocks': len(self.blocks)
+        }
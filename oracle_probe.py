@@ -0,0 +1,194 @@
+"""
+ECB Oracle 參數探測
+
+在逐字節攻擊之前，需要知道 Oracle 的分組大小、固定前綴長度，以及把輸入補齊到
+分組邊界所需的填充長度。每次查詢都可能很昂貴，因此 OracleProbe:
+- 記住每個明文的響應，重複的探測不再查詢
+- 盡量復用已有的響應推導多個參數（例如分組大小探測時順帶得到秘密長度）
+- 支持批量查詢時一次發送多個探測明文
+- 可設置查詢預算，超出時拋出 QueryBudgetExceeded
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """探測所需的查詢超出了預算"""
+
+
+class ProbeResult(NamedTuple):
+    """探測結果"""
+    block_size: int
+    prefix_length: int
+    alignment: int      # 把前綴補齊到分組邊界所需的填充字節數
+    secret_length: int  # Oracle 附加在輸入之後的數據長度（假設 PKCS#7 填充）
+    is_ecb: bool
+    queries: int        # 實際發送給 Oracle 的明文數
+
+
+class OracleProbe:
+    """
+    帶記憶化和查詢預算的 Oracle 包裝，本身也可以作為加密函數使用
+
+    用法:
+        probe = OracleProbe(oracle, max_queries=100)
+        result = probe.discover()
+        print(result.block_size, result.prefix_length, probe.stats())
+    """
+
+    def __init__(self, oracle, max_queries: Optional[int] = None, filler: bytes = b'A',
+                 markers: Tuple[bytes, bytes] = (b'B', b'C')):
+        """
+        參數:
+            oracle: 接受明文 bytes、返回密文 bytes 的函數，支持 encrypt_batch 時批量查詢
+            max_queries: 最多發送給 Oracle 的明文數，None 表示不限制
+            filler: 探測使用的填充字節
+            markers: 兩個與 filler 不同的標記字節，用於定位輸入的起始位置
+        """
+        self.oracle = oracle
+        self.max_queries = max_queries
+        self.filler = filler
+        self.markers = markers
+        self.queries = 0      # 實際發送的明文數
+        self.oracle_calls = 0  # Oracle 往返次數
+        self.cache_hits = 0
+        self._responses: Dict[bytes, bytes] = {}
+        # 長度探測的結果: 填充長度 -> 密文長度
+        self._lengths: Dict[int, int] = {}
+        self._block_size = None
+        self._boundary_padding = None
+        self._prefix_length = None
+
+    def _reserve(self, count):
+        if self.max_queries is not None and self.queries + count > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"查詢預算 {self.max_queries} 不足: 已使用 {self.queries}，還需要 {count}")
+        self.queries += count
+
+    def __call__(self, plaintext: bytes) -> bytes:
+        plaintext = bytes(plaintext)
+        if plaintext in self._responses:
+            self.cache_hits += 1
+            return self._responses[plaintext]
+        self._reserve(1)
+        self.oracle_calls += 1
+        ciphertext = self.oracle(plaintext)
+        self._responses[plaintext] = ciphertext
+        return ciphertext
+
+    def encrypt_batch(self, plaintexts):
+        """批量查詢，只發送沒有記錄過的明文"""
+        plaintexts = [bytes(plaintext) for plaintext in plaintexts]
+        missing = list(dict.fromkeys(p for p in plaintexts if p not in self._responses))
+        self.cache_hits += len(plaintexts) - len(missing)
+        if missing:
+            self._reserve(len(missing))
+            encrypt_batch = getattr(self.oracle, 'encrypt_batch', None)
+            if encrypt_batch is not None:
+                self.oracle_calls += 1
+                ciphertexts = encrypt_batch(missing)
+            else:
+                self.oracle_calls += len(missing)
+                ciphertexts = [self.oracle(plaintext) for plaintext in missing]
+            self._responses.update(zip(missing, ciphertexts))
+        return [self._responses[plaintext] for plaintext in plaintexts]
+
+    def _length(self, pad_length):
+        if pad_length not in self._lengths:
+            self._lengths[pad_length] = len(self(self.filler * pad_length))
+        return self._lengths[pad_length]
+
+    def block_size(self, max_block_size: int = 64) -> int:
+        """
+        逐字節增加輸入，密文長度第一次增加的幅度即為分組大小
+
+        同時記錄此時的輸入長度，即前綴 + 秘密補齊到分組邊界所需的字節數
+        """
+        if self._block_size is None:
+            base_length = self._length(0)
+            for pad_length in range(1, max_block_size + 1):
+                grown = self._length(pad_length)
+                if grown > base_length:
+                    self._block_size = grown - base_length
+                    self._boundary_padding = pad_length
+                    break
+            else:
+                raise ValueError(f"輸入增加到 {max_block_size} 字節時密文長度仍未變化，無法確定分組大小")
+        return self._block_size
+
+    def _blocks(self, ciphertext, block_size):
+        return [ciphertext[i:i + block_size] for i in range(0, len(ciphertext), block_size)]
+
+    def is_ecb(self, block_size: Optional[int] = None) -> bool:
+        """輸入三個相同的分組，無論前綴多長都至少有兩個完整的相同密文分組"""
+        block_size = block_size or self.block_size()
+        blocks = self._blocks(self(self.filler * (3 * block_size)), block_size)
+        return len(blocks) != len(set(blocks))
+
+    def prefix_length(self, block_size: Optional[int] = None) -> int:
+        """
+        探測 Oracle 在輸入之前添加的固定前綴長度
+
+        在兩個標記分組之前放 0..分組大小-1 個填充字節，標記分組恰好對齊時出現兩個相鄰且
+        相同的密文分組；前綴長度 = 標記分組的起始位置 - 填充字節數。
+        每種填充長度分別用兩種標記字節探測，只接受兩種標記都在同一位置成對、且該位置的
+        分組不同的結果，以排除前綴末尾或秘密開頭恰好是標記字節、以及秘密內部本身重複的情況。
+        Oracle 支持批量查詢時所有候選明文在一次往返中發送，否則逐個查詢並在找到後停止。
+        """
+        if self._prefix_length is not None:
+            return self._prefix_length
+        block_size = block_size or self.block_size()
+        first, second = self.markers
+        if hasattr(self.oracle, 'encrypt_batch'):
+            self.encrypt_batch(self.filler * pad_length + marker * (2 * block_size)
+                               for pad_length in range(block_size) for marker in (first, second))
+        for pad_length in range(block_size):
+            first_blocks = self._blocks(self(self.filler * pad_length + first * (2 * block_size)), block_size)
+            second_blocks = self._blocks(self(self.filler * pad_length + second * (2 * block_size)), block_size)
+            for index in range(min(len(first_blocks), len(second_blocks)) - 1):
+                if (first_blocks[index] == first_blocks[index + 1] and
+                        second_blocks[index] == second_blocks[index + 1] and
+                        first_blocks[index] != second_blocks[index]):
+                    self._prefix_length = index * block_size - pad_length
+                    return self._prefix_length
+        raise ValueError("找不到對齊的重複分組，Oracle 可能不是 ECB 模式")
+
+    def _find_boundary_padding(self, block_size: int) -> int:
+        """分組大小由調用方給出、未經 block_size 探測時，單獨探測密文長度第一次增加時的輸入長度"""
+        base_length = self._length(0)
+        for pad_length in range(1, block_size + 1):
+            if self._length(pad_length) > base_length:
+                self._boundary_padding = pad_length
+                return pad_length
+        raise ValueError(f"輸入增加到 {block_size} 字節時密文長度仍未變化，分組大小 {block_size} 可能不正確")
+
+    def secret_length(self, block_size: Optional[int] = None, prefix_length: Optional[int] = None) -> int:
+        """由分組大小探測時的長度變化推算秘密長度，已探測過分組大小時不需要額外查詢"""
+        block_size = block_size or self.block_size()
+        prefix_length = self.prefix_length(block_size) if prefix_length is None else prefix_length
+        boundary_padding = self._boundary_padding
+        if boundary_padding is None:
+            boundary_padding = self._find_boundary_padding(block_size)
+        return self._length(0) - prefix_length - boundary_padding
+
+    def discover(self) -> ProbeResult:
+        """依次探測分組大小、ECB、前綴長度和秘密長度"""
+        block_size = self.block_size()
+        is_ecb = self.is_ecb(block_size)
+        prefix_length = self.prefix_length(block_size) if is_ecb else 0
+        return ProbeResult(
+            block_size=block_size,
+            prefix_length=prefix_length,
+            alignment=(-prefix_length) % block_size,
+            secret_length=self.secret_length(block_size, prefix_length),
+            is_ecb=is_ecb,
+            queries=self.queries
+        )
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """查詢統計"""
+        return {
+            'queries': self.queries,
+            'oracle_calls': self.oracle_calls,
+            'cache_hits': self.cache_hits,
+            'max_queries': self.max_queries
+        }
@@ -0,0 +1,395 @@
+"""
+沙箱化的 Oracle 工作進程池
+
+生成的 ecb_encrypt.py 來自任意 GitHub 存儲庫，屬於不可信代碼。本模塊在受限的
+oracle_worker 工作進程中運行它們:
+- 網絡隔離: 工作進程進入只有回環接口的新網絡命名空間（Linux unshare，需要時連同新的
+  用戶命名空間），其子進程同樣無法聯網；無法建立隔離時默認拒絕啟動（見 require_network_isolation）
+- rlimit 限制 CPU 時間、地址空間、可寫文件大小和進程數，不生成 core 文件
+  （內核不對 root 用戶施加進程數限制）
+- 在獨立的臨時目錄中運行，每次加載 Oracle 前清空
+- 另外替換 socket 接口，作為進程內的額外防線
+
+OraclePool 預先啟動若干工作進程並預先導入常見的加密庫，取用時通過 LOAD 請求加載 Oracle，
+不必等待進程啟動和加密庫導入。每個工作進程只服務一個存儲庫: 預先導入的模塊在進程內共享，
+一個 Oracle 對它們的修改（如替換 AES.new）不能影響之後的存儲庫，因此歸還時關閉進程，
+並在後台啟動新的工作進程補充進程池。
+
+rlimit 僅在 POSIX 上生效，網絡命名空間僅在 Linux 上可用。
+"""
+import os
+import sys
+import math
+import queue
+import ctypes
+import shutil
+import socket
+import argparse
+import tempfile
+import importlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Sequence
+
+try:
+    import resource
+except ImportError:
+    # Windows 沒有 resource 模塊
+    resource = None
+
+from oracle_worker import OracleClient, add_oracle_arguments, load_oracle, run_worker
+
+SANDBOX_SCRIPT = os.path.abspath(__file__)
+
+# 工作進程啟動時預先導入的加密庫（未安裝的會被跳過）
+DEFAULT_PRELOAD = (
+    'Crypto.Cipher.AES',
+    'Cryptodome.Cipher.AES',
+    'cryptography.hazmat.primitives.ciphers',
+)
+
+# linux/sched.h 中的 unshare 標誌（Python 3.12 之前 os 模塊沒有 unshare）
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+
+class SandboxLimits(NamedTuple):
+    """工作進程的資源限制"""
+    cpu_seconds: int = 60    # 每個 Oracle 可用的 CPU 秒數
+    memory_mb: int = 1024    # 地址空間上限
+    file_size_mb: int = 64   # 可寫文件大小上限
+    max_loads: int = 50      # 一個工作進程最多加載的 Oracle 數（OraclePool 中固定為 1）
+    max_processes: int = 0   # RLIMIT_NPROC，0 表示不能創建子進程或線程
+    require_network_isolation: bool = True  # 無法進入新的網絡命名空間時拒絕啟動
+
+
+class NetworkDisabledError(PermissionError):
+    """沙箱中的代碼試圖訪問網絡"""
+
+
+def _lower_limit(name, soft, hard):
+    """在當前硬上限之內設置 rlimit，不支持的限制被忽略"""
+    which = getattr(resource, name, None) if resource is not None else None
+    if which is None:
+        return
+    _, current_hard = resource.getrlimit(which)
+    if current_hard != resource.RLIM_INFINITY:
+        soft, hard = min(soft, current_hard), min(hard, current_hard)
+    try:
+        resource.setrlimit(which, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return math.ceil(usage.ru_utime + usage.ru_stime)
+
+
+def apply_limits(limits: SandboxLimits):
+    """
+    在工作進程中設置資源限制
+
+    CPU 的硬上限覆蓋工作進程加載 max_loads 個 Oracle 的總預算，軟上限在每次加載時
+    由 renew_cpu_budget 續期；超出軟上限時進程收到 SIGXCPU 退出
+    """
+    if resource is None:
+        return
+    megabyte = 1024 * 1024
+    _lower_limit('RLIMIT_AS', limits.memory_mb * megabyte, limits.memory_mb * megabyte)
+    _lower_limit('RLIMIT_FSIZE', limits.file_size_mb * megabyte, limits.file_size_mb * megabyte)
+    _lower_limit('RLIMIT_CORE', 0, 0)
+    _lower_limit('RLIMIT_NPROC', limits.max_processes, limits.max_processes)
+    cpu_hard = _cpu_used() + limits.cpu_seconds * (limits.max_loads + 1)
+    _lower_limit('RLIMIT_CPU', _cpu_used() + limits.cpu_seconds, cpu_hard)
+
+
+def renew_cpu_budget(cpu_seconds: int):
+    """把 CPU 軟上限設為已用時間 + cpu_seconds（不超過硬上限）"""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    _lower_limit('RLIMIT_CPU', _cpu_used() + cpu_seconds, hard)
+
+
+def _unshare(flags):
+    unshare = getattr(os, 'unshare', None)
+    if unshare is not None:
+        unshare(flags)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def isolate_network() -> bool:
+    """
+    讓工作進程（及其之後創建的子進程）進入新的網絡命名空間
+
+    先嘗試只創建網絡命名空間（需要 CAP_SYS_ADMIN），失敗時連同用戶命名空間一起創建
+    （無特權用戶可用）；成功後確認只剩回環接口
+
+    返回:
+        bool: 是否已隔離
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    for flags in (CLONE_NEWNET, CLONE_NEWUSER | CLONE_NEWNET):
+        try:
+            _unshare(flags)
+        except (OSError, AttributeError):
+            continue
+        return all(name == 'lo' for _, name in socket.if_nameindex())
+    return False
+
+
+def _blocked(*args, **kwargs):
+    raise NetworkDisabledError("沙箱中禁止網絡訪問")
+
+
+class _BlockedSocket(socket.socket):
+    def __init__(self, *args, **kwargs):
+        _blocked()
+
+
+def disable_network() -> bool:
+    """
+    隔離工作進程的網絡
+
+    進入新的網絡命名空間（見 isolate_network），並替換 socket 的構造函數和域名解析函數。
+    後者只是進程內的額外防線，可以被子進程等方式繞過，不能單獨作為隔離手段
+
+    返回:
+        bool: 網絡命名空間隔離是否生效
+    """
+    isolated = isolate_network()
+
+    import _socket
+    for module in (socket, _socket):
+        module.socket = _BlockedSocket
+    for name in ('create_connection', 'create_server', 'socketpair', 'fromfd',
+                 'getaddrinfo', 'gethostbyname', 'gethostbyname_ex', 'gethostbyaddr'):
+        if hasattr(socket, name):
+            setattr(socket, name, _blocked)
+    return isolated
+
+
+def preload_modules(modules: Sequence[str]):
+    """預先導入加密庫，加載 Oracle 時不再付出導入的開銷"""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _clear_directory(path):
+    for name in os.listdir(path):
+        target = os.path.join(path, name)
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target, ignore_errors=True)
+        else:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+
+
+def make_sandbox_loader(workdir, cpu_seconds):
+    """
+    返回工作進程的 Oracle 加載函數: 清空並回到臨時目錄、續期 CPU 預算後加載
+    """
+    def load(oracle_path, entry=None, key=None):
+        os.chdir(workdir)
+        _clear_directory(workdir)
+        renew_cpu_budget(cpu_seconds)
+        return load_oracle(oracle_path, entry, key)
+    return load
+
+
+def main(argv=None):
+    """沙箱工作進程入口，由 SandboxedClient 啟動"""
+    defaults = SandboxLimits()
+    parser = argparse.ArgumentParser(description="在資源受限、無網絡的沙箱中運行 Oracle 工作進程")
+    add_oracle_arguments(parser)
+    parser.add_argument('--cpu-seconds', type=int, default=defaults.cpu_seconds, help="每個 Oracle 的 CPU 秒數")
+    parser.add_argument('--memory-mb', type=int, default=defaults.memory_mb, help="地址空間上限（MB）")
+    parser.add_argument('--file-size-mb', type=int, default=defaults.file_size_mb, help="可寫文件大小上限（MB）")
+    parser.add_argument('--max-loads', type=int, default=defaults.max_loads, help="最多加載的 Oracle 數")
+    parser.add_argument('--max-processes', type=int, default=defaults.max_processes, help="進程數上限（RLIMIT_NPROC）")
+    parser.add_argument('--allow-unisolated', action='store_true', help="無法建立網絡隔離時仍然運行（只發出警告）")
+    parser.add_argument('--preload', action='append', default=[], help="預先導入的模塊（可重複）")
+    args = parser.parse_args(argv)
+
+    workdir = os.getcwd()
+    network_isolated = disable_network()
+    if not network_isolated:
+        if not args.allow_unisolated:
+            return run_worker(startup_error="無法建立網絡隔離（unshare 網絡命名空間失敗），拒絕運行 Oracle")
+        print("⚠️ 無法建立網絡隔離，Oracle 在沒有網絡命名空間的情況下運行", file=sys.stderr)
+    preload_modules(args.preload)
+    # 預先導入之後再設置限制，避免大型庫的導入佔用 Oracle 的預算
+    apply_limits(SandboxLimits(args.cpu_seconds, args.memory_mb, args.file_size_mb, args.max_loads,
+                               args.max_processes))
+    return run_worker(args.oracle_path, args.entry, bytes.fromhex(args.key) if args.key else None,
+                      loader=make_sandbox_loader(workdir, args.cpu_seconds),
+                      info={'network_isolated': network_isolated})
+
+
+class SandboxedClient(OracleClient):
+    """
+    在沙箱工作進程中運行 Oracle 的客戶端，接口與 OracleClient 相同
+
+    用法:
+        with SandboxedClient("out/ecb_encrypt.py", timeout=30) as oracle:
+            ciphertext = oracle(b"A" * 16)
+    """
+
+    def __init__(self, oracle_path=None, entry=None, key=None, python=sys.executable, timeout=None,
+                 limits: SandboxLimits = SandboxLimits(), preload: Sequence[str] = DEFAULT_PRELOAD):
+        """
+        參數:
+            oracle_path, entry, key, python, timeout: 同 OracleClient
+            limits: 資源限制
+            preload: 工作進程啟動時預先導入的模塊
+        """
+        self.limits = limits
+        self.preload = tuple(preload)
+        self.loads = 1 if oracle_path else 0
+        self.workdir = tempfile.mkdtemp(prefix="oracle_sandbox_")
+        try:
+            super().__init__(oracle_path, entry, key, python, timeout)
+        except Exception:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            raise
+
+    def _worker_command(self):
+        command = [SANDBOX_SCRIPT,
+                   '--cpu-seconds', str(self.limits.cpu_seconds),
+                   '--memory-mb', str(self.limits.memory_mb),
+                   '--file-size-mb', str(self.limits.file_size_mb),
+                   '--max-loads', str(self.limits.max_loads),
+                   '--max-processes', str(self.limits.max_processes)]
+        if not self.limits.require_network_isolation:
+            command.append('--allow-unisolated')
+        for module in self.preload:
+            command += ['--preload', module]
+        return command
+
+    def _worker_cwd(self):
+        return self.workdir
+
+    @property
+    def network_isolated(self):
+        """工作進程是否運行在獨立的網絡命名空間中"""
+        return bool(self.worker_info.get('network_isolated'))
+
+    def load(self, oracle_path, entry=None, key=None):
+        self.loads += 1
+        super().load(oracle_path, entry, key)
+
+    def close(self):
+        super().close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class OraclePool:
+    """
+    預先啟動的沙箱工作進程池，線程安全
+
+    用法:
+        with OraclePool(size=4, timeout=30) as pool:
+            with pool.oracle("repo_a/ecb_encrypt.py") as oracle:
+                ciphertexts = oracle.encrypt_batch([b"A" * 16, b"B" * 16])
+    """
+
+    def __init__(self, size: int = 2, limits: SandboxLimits = SandboxLimits(), timeout=None,
+                 preload: Sequence[str] = DEFAULT_PRELOAD, python=sys.executable):
+        """
+        參數:
+            size: 工作進程數
+            limits: 每個工作進程的資源限制
+            timeout: 每個響應的最長等待秒數，超時的工作進程被殺死並在下次取用時重啟
+            preload: 工作進程啟動時預先導入的模塊
+            python: 運行工作進程的解釋器
+        """
+        self.size = max(1, size)
+        self.limits = limits
+        self.timeout = timeout
+        self.preload = tuple(preload)
+        self.python = python
+        self.started = 0     # 啟動過的工作進程數
+        self.loads = 0       # 加載過的 Oracle 數
+        self.unisolated = 0  # 沒有網絡隔離的工作進程數（僅在允許時出現）
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._idle = queue.Queue()  # 啟動中或已就緒的工作進程（Future）
+        self._spawner = ThreadPoolExecutor(self.size)
+        # 並行啟動所有工作進程；任何一個啟動失敗時關閉已經啟動的進程
+        futures = [self._spawner.submit(self._spawn) for _ in range(self.size)]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            self.close()
+            raise
+        for future in futures:
+            self._idle.put(future)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _spawn(self):
+        worker = SandboxedClient(None, python=self.python, timeout=self.timeout,
+                                 limits=self.limits._replace(max_loads=1), preload=self.preload)
+        with self._lock:
+            self._workers.add(worker)
+            self.started += 1
+            if not worker.network_isolated:
+                self.unisolated += 1
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.close()
+
+    @contextmanager
+    def oracle(self, oracle_path, entry=None, key=None):
+        """
+        取出一個預熱的工作進程並加載 Oracle；退出時關閉該進程，並在後台啟動新的進程補充進程池
+
+        工作進程啟動失敗或 Oracle 加載失敗時拋出 OracleError
+        """
+        pending = self._idle.get()
+        worker = None
+        try:
+            worker = pending.result()
+            worker.load(oracle_path, entry, key)
+            with self._lock:
+                self.loads += 1
+            yield worker
+        finally:
+            if worker is not None:
+                self._retire(worker)
+            self._idle.put(self._spawner.submit(self._spawn))
+
+    def close(self):
+        """關閉所有工作進程（等待後台啟動中的進程啟動完成後一併關閉）"""
+        self._spawner.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.close()
+
+    def stats(self):
+        return {'size': self.size, 'started': self.started, 'loads': self.loads, 'unisolated': self.unisolated}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
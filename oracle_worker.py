@@ -0,0 +1,464 @@
+"""
+常駐的加密 Oracle 工作進程
+
+工作進程只加載一次生成的 ecb_encrypt.py，之後通過標準輸入輸出上的
+長度前綴二進制幀接受任意多個明文，避免每個明文都重新啟動解釋器和導入加密庫。
+LOAD 操作在同一個進程中換用另一個 Oracle 文件，工作進程因此可以在多個存儲庫之間復用。
+
+幀格式: 4 字節大端長度 + 內容
+    請求內容: 1 字節操作碼 + 參數
+    響應內容: 1 字節狀態碼 + 結果（出錯時為 UTF-8 錯誤信息）
+
+用法:
+    python oracle_worker.py [ecb_encrypt.py] [--entry 函數或類.方法] [--key 十六進制密鑰]
+"""
+import os
+import sys
+import json
+import struct
+import base64
+import select
+import inspect
+import argparse
+import binascii
+import importlib.util
+import subprocess
+
+# 操作碼
+OP_ENCRYPT = b'E'  # 參數: 明文；結果: 密文
+OP_BATCH = b'B'    # 參數: 打包的明文列表；結果: 打包的密文列表
+OP_LOAD = b'L'     # 參數: 打包的 [Oracle 路徑, 入口, 密鑰]（空項表示默認）；結果: 空
+OP_PING = b'P'     # 無參數；結果: 空
+OP_QUIT = b'Q'     # 無參數；工作進程退出
+
+# 狀態碼
+STATUS_OK = b'\x00'
+STATUS_ERROR = b'\x01'
+
+FRAME_HEADER = struct.Struct('>I')
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+class OracleError(RuntimeError):
+    """Oracle 加載或調用失敗"""
+
+
+def pack_items(items):
+    """把多個字節串打包為: 4 字節個數 + 每項的長度前綴內容"""
+    parts = [FRAME_HEADER.pack(len(items))]
+    for item in items:
+        parts.append(FRAME_HEADER.pack(len(item)))
+        parts.append(item)
+    return b''.join(parts)
+
+
+def unpack_items(data):
+    """pack_items 的逆操作"""
+    count, = FRAME_HEADER.unpack_from(data, 0)
+    offset = FRAME_HEADER.size
+    items = []
+    for _ in range(count):
+        length, = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        items.append(bytes(data[offset:offset + length]))
+        offset += length
+    return items
+
+
+def write_frame(stream, payload):
+    stream.write(FRAME_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def read_frame(stream):
+    """讀取一個幀，流結束時返回 None"""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    length, = FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return payload
+
+
+def _import_oracle_module(oracle_path):
+    """從文件路徑導入 Oracle 模塊（所在目錄加入 sys.path，以便導入項目內的其他模塊）"""
+    oracle_dir = os.path.dirname(os.path.abspath(oracle_path))
+    if oracle_dir not in sys.path:
+        sys.path.insert(0, oracle_dir)
+    spec = importlib.util.spec_from_file_location("ecb_encrypt", oracle_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _required_positional(func):
+    """函數必須提供的位置參數個數（不含 self）"""
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    return sum(1 for p in parameters
+               if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) and p.default is p.empty)
+
+
+def _is_encrypt_name(name):
+    name = name.lower()
+    return 'encrypt' in name and 'decrypt' not in name
+
+
+def find_oracle_function(module, key=None):
+    """
+    在 Oracle 模塊中查找加密入口
+
+    優先選擇名稱包含 encrypt（且不含 decrypt）的模塊級函數，其次是可無參數實例化、
+    帶有 encrypt 方法的類；提供 key 時也接受 (明文, 密鑰) 兩個參數的函數
+
+    返回:
+        callable: 接受明文的函數，未找到時為 None
+    """
+    arity = 2 if key is not None else 1
+    candidates = []
+    for name, obj in vars(module).items():
+        if inspect.isfunction(obj) and obj.__module__ == module.__name__ and _is_encrypt_name(name):
+            if _required_positional(obj) == arity:
+                # 名稱包含 ecb 的函數優先
+                candidates.append(('ecb' not in name.lower(), name, obj))
+    if candidates:
+        func = min(candidates, key=lambda c: c[:2])[2]
+        return func if key is None else (lambda plaintext: func(plaintext, key))
+
+    for name, obj in vars(module).items():
+        if inspect.isclass(obj) and obj.__module__ == module.__name__:
+            method = getattr(obj, 'encrypt', None)
+            if method is None or _required_positional(obj) not in (0, 1):
+                continue
+            try:
+                instance = obj() if key is None else obj(key)
+            except Exception:
+                continue
+            if _required_positional(instance.encrypt) == 1:
+                return instance.encrypt
+    return None
+
+
+def load_oracle(oracle_path, entry=None, key=None):
+    """
+    加載 Oracle 文件並返回加密函數
+
+    參數:
+        oracle_path (str): generate_fixed_oracle_file 生成的文件路徑
+        entry (str, optional): 入口名稱，函數名或 類名.方法名（類會以無參數或 key 實例化）
+        key (bytes, optional): 密鑰，作為加密函數的第二個參數或類構造參數
+
+    返回:
+        callable: 接受明文 bytes、返回密文 bytes 的函數
+    """
+    module = _import_oracle_module(oracle_path)
+    if entry:
+        owner_name, _, attr = entry.partition('.')
+        target = getattr(module, owner_name, None)
+        if target is not None and attr:
+            target = getattr(target() if key is None else target(key), attr, None)
+        elif target is not None and key is not None:
+            func = target
+            target = lambda plaintext: func(plaintext, key)
+    else:
+        target = find_oracle_function(module, key)
+    if target is None:
+        raise OracleError(f"在 {oracle_path} 中找不到加密入口" + (f" {entry}" if entry else ""))
+
+    def oracle(plaintext):
+        try:
+            result = target(plaintext)
+        except TypeError:
+            # 部分實現只接受 str
+            result = target(plaintext.decode('latin-1'))
+        return _coerce_ciphertext(result)
+    oracle.path = os.path.abspath(oracle_path)
+    return oracle
+
+
+def unload_oracle(oracle):
+    """
+    卸載 Oracle: 從 sys.path 移除其所在目錄，並刪除從該目錄導入的模塊，
+    避免下一個存儲庫的同名模塊（如 utils、crypto）命中舊模塊
+    """
+    path = getattr(oracle, 'path', None)
+    if path is None:
+        return
+    oracle_dir = os.path.dirname(path)
+    while oracle_dir in sys.path:
+        sys.path.remove(oracle_dir)
+    prefix = oracle_dir + os.sep
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None) or ''
+        if os.path.abspath(module_file).startswith(prefix):
+            del sys.modules[name]
+
+
+def load_in_place(oracle_path, entry=None, key=None):
+    """切換到 Oracle 所在目錄後加載，與 OracleClient 啟動工作進程時的工作目錄一致"""
+    os.chdir(os.path.dirname(os.path.abspath(oracle_path)))
+    return load_oracle(oracle_path, entry, key)
+
+
+def _coerce_ciphertext(result):
+    """把加密函數的返回值統一為 bytes（支持 bytes、十六進制或 Base64 字符串）"""
+    if isinstance(result, (bytes, bytearray, memoryview)):
+        return bytes(result)
+    if isinstance(result, str):
+        try:
+            return bytes.fromhex(result)
+        except ValueError:
+            pass
+        try:
+            return base64.b64decode(result, validate=True)
+        except (binascii.Error, ValueError):
+            return result.encode('latin-1')
+    raise OracleError(f"無法識別的密文類型: {type(result).__name__}")
+
+
+def handle_request(oracle, payload):
+    """
+    處理一個請求幀
+
+    返回:
+        tuple: (響應內容, 是否繼續運行)
+    """
+    op, body = payload[:1], payload[1:]
+    if oracle is None and op in (OP_ENCRYPT, OP_BATCH):
+        return STATUS_ERROR + "尚未加載 Oracle".encode('utf-8'), True
+    try:
+        if op == OP_ENCRYPT:
+            return STATUS_OK + oracle(bytes(body)), True
+        if op == OP_BATCH:
+            return STATUS_OK + pack_items([oracle(item) for item in unpack_items(body)]), True
+        if op == OP_PING:
+            return STATUS_OK, True
+        if op == OP_QUIT:
+            return STATUS_OK, False
+        return STATUS_ERROR + f"未知操作碼: {op!r}".encode('utf-8'), True
+    except Exception as e:
+        return STATUS_ERROR + f"{type(e).__name__}: {e}".encode('utf-8'), True
+
+
+def handle_load(oracle, body, loader=load_in_place):
+    """
+    處理 LOAD 請求: 卸載當前 Oracle 並用 loader 加載新的 Oracle
+
+    返回:
+        tuple: (新的 Oracle，加載失敗時為 None, 響應內容)
+    """
+    try:
+        path, entry, key = unpack_items(body)
+        unload_oracle(oracle)
+        oracle = loader(path.decode('utf-8'), entry.decode('utf-8') or None, key or None)
+    except Exception as e:
+        return None, STATUS_ERROR + f"{type(e).__name__}: {e}".encode('utf-8')
+    return oracle, STATUS_OK
+
+
+def serve(oracle, stream_in, stream_out, loader=load_in_place):
+    """在給定的二進制流上處理請求，直到收到 QUIT 或輸入結束"""
+    while True:
+        payload = read_frame(stream_in)
+        if payload is None:
+            return
+        if payload[:1] == OP_LOAD:
+            oracle, response = handle_load(oracle, payload[1:], loader)
+            write_frame(stream_out, response)
+            continue
+        response, keep_running = handle_request(oracle, payload)
+        write_frame(stream_out, response)
+        if not keep_running:
+            return
+
+
+def _take_stdout():
+    """
+    取得協議使用的標準輸出，並把文件描述符 1 重定向到標準錯誤，
+    避免 Oracle 代碼中的 print 破壞幀
+    """
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return channel
+
+
+def run_worker(oracle_path=None, entry=None, key=None, loader=load_in_place, info=None, startup_error=None):
+    """
+    運行工作進程主循環；oracle_path 為 None 時不加載 Oracle，等待 LOAD 請求
+
+    第一個幀報告啟動（及初始加載）的結果: 成功時附帶 JSON 編碼的 info，
+    startup_error 不為空時報告該錯誤並退出
+    """
+    channel = _take_stdout()
+    if startup_error:
+        write_frame(channel, STATUS_ERROR + startup_error.encode('utf-8'))
+        return 1
+    oracle = None
+    if oracle_path:
+        try:
+            oracle = loader(oracle_path, entry, key)
+        except Exception as e:
+            write_frame(channel, STATUS_ERROR + f"{type(e).__name__}: {e}".encode('utf-8'))
+            return 1
+    write_frame(channel, STATUS_OK + (json.dumps(info).encode('utf-8') if info else b''))
+    serve(oracle, sys.stdin.buffer, channel, loader)
+    return 0
+
+
+def add_oracle_arguments(parser):
+    parser.add_argument('oracle_path', nargs='?', help="Oracle 文件路徑（ecb_encrypt.py），省略時等待 LOAD 請求")
+    parser.add_argument('--entry', help="入口函數名或 類名.方法名，默認自動查找")
+    parser.add_argument('--key', help="十六進制密鑰，作為加密函數的第二個參數")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐的加密 Oracle 工作進程")
+    add_oracle_arguments(parser)
+    args = parser.parse_args(argv)
+    return run_worker(args.oracle_path, args.entry, bytes.fromhex(args.key) if args.key else None)
+
+
+class OracleClient:
+    """
+    常駐 Oracle 工作進程的客戶端，可直接作為加密函數調用
+
+    用法:
+        with OracleClient("out/ecb_encrypt.py") as oracle:
+            ciphertexts = oracle.encrypt_batch([b"A" * 16, b"B" * 16])
+    """
+
+    def __init__(self, oracle_path=None, entry=None, key=None, python=sys.executable, timeout=None):
+        """
+        參數:
+            oracle_path (str, optional): Oracle 文件路徑，工作進程在其所在目錄中運行；
+                None 時啟動空閒的工作進程，之後用 load 加載
+            entry (str, optional): 入口函數名或 類名.方法名
+            key (bytes, optional): 傳給加密函數的密鑰
+            python (str): 運行工作進程的解釋器
+            timeout (float, optional): 每個響應的最長等待秒數（僅 POSIX）
+        """
+        self.oracle_path = os.path.abspath(oracle_path) if oracle_path else None
+        self.timeout = timeout
+        self.query_count = 0  # 已加密的明文數
+        self.round_trips = 0  # 請求往返次數
+        command = [python] + self._worker_command()
+        if self.oracle_path:
+            command.append(self.oracle_path)
+        if entry:
+            command += ['--entry', entry]
+        if key is not None:
+            command += ['--key', key.hex()]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         cwd=self._worker_cwd())
+        try:
+            ready = self._check(self._read_response())
+            # 工作進程在啟動幀中報告的環境信息（例如沙箱是否生效）
+            self.worker_info = json.loads(ready) if ready else {}
+        except OracleError:
+            self.close()
+            raise
+
+    def _worker_command(self):
+        """工作進程的腳本及其選項（不含 Oracle 參數）"""
+        return [WORKER_SCRIPT]
+
+    def _worker_cwd(self):
+        return os.path.dirname(self.oracle_path) if self.oracle_path else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, plaintext):
+        return self.encrypt(plaintext)
+
+    def _read_exact(self, size):
+        # 直接讀文件描述符，避免緩衝區中已有數據時 select 仍然阻塞
+        fd = self._process.stdout.fileno()
+        chunks = []
+        while size:
+            if self.timeout is not None:
+                ready, _, _ = select.select([fd], [], [], self.timeout)
+                if not ready:
+                    self._process.kill()
+                    raise OracleError(f"Oracle 在 {self.timeout} 秒內沒有響應")
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise OracleError(f"Oracle 工作進程已退出（退出碼 {self._process.wait()}）")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _read_response(self):
+        length, = FRAME_HEADER.unpack(self._read_exact(FRAME_HEADER.size))
+        return self._read_exact(length) if length else b''
+
+    @staticmethod
+    def _check(response):
+        if response[:1] != STATUS_OK:
+            raise OracleError(response[1:].decode('utf-8', 'replace'))
+        return response[1:]
+
+    def request(self, op, body=b''):
+        """發送一個請求並返回結果，工作進程報錯時拋出 OracleError"""
+        if self._process.poll() is not None:
+            raise OracleError(f"Oracle 工作進程已退出（退出碼 {self._process.returncode}）")
+        try:
+            write_frame(self._process.stdin, op + body)
+        except (BrokenPipeError, OSError) as e:
+            raise OracleError(f"無法寫入 Oracle 工作進程: {e}")
+        self.round_trips += 1
+        return self._check(self._read_response())
+
+    @property
+    def alive(self):
+        return self._process.poll() is None
+
+    def load(self, oracle_path, entry=None, key=None):
+        """在已運行的工作進程中換用另一個 Oracle 文件，加載失敗時拋出 OracleError"""
+        oracle_path = os.path.abspath(oracle_path)
+        self.oracle_path = None
+        self.request(OP_LOAD, pack_items([oracle_path.encode('utf-8'), (entry or '').encode('utf-8'), key or b'']))
+        self.oracle_path = oracle_path
+
+    def encrypt(self, plaintext):
+        """加密單個明文"""
+        self.query_count += 1
+        return self.request(OP_ENCRYPT, bytes(plaintext))
+
+    def encrypt_batch(self, plaintexts):
+        """在一次往返中加密多個明文，按順序返回密文"""
+        plaintexts = [bytes(p) for p in plaintexts]
+        if not plaintexts:
+            return []
+        self.query_count += len(plaintexts)
+        return unpack_items(self.request(OP_BATCH, pack_items(plaintexts)))
+
+    def close(self):
+        """通知工作進程退出並等待其結束"""
+        process = self._process
+        if process.poll() is None:
+            try:
+                write_frame(process.stdin, OP_QUIT)
+                process.stdin.close()
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+                process.wait()
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())